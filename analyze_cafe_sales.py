@@ -1,191 +1,582 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-from datetime import datetime
-from matplotlib.ticker import FuncFormatter
+import argparse
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
 
-# Create output directory if it doesn't exist
-os.makedirs('analysis_results', exist_ok=True)
+from profiling import (add_profile_arguments, add_records, finish_profiling, profiling_enabled, run_profiled, stage,
+                       start_profiling)
+from sales_schema import CALENDAR_FIELDS, MONEY_COLUMNS, calendar_field, decode_transaction_ids
+from sales_storage import find_dataset, load_sales, path_for_format, save_sales, FORMATS, columnar_available
+from report_writer import ReportWriter
+from transaction_store import TransactionStore
+import sales_cube
 
-# Set the style for better-looking plots
-sns.set_theme(style="whitegrid")
-plt.rcParams['figure.figsize'] = (14, 10)
-plt.rcParams['font.size'] = 12
+# Importing this module does no work: matplotlib/seaborn are only imported by
+# render_chart, and nothing is computed or written until run_pipeline() is called.
 
-# Helper function for currency formatting
-def currency(x, pos):
-    return f'${x:,.2f}'
+OUTPUT_DIR = 'analysis_results'
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+ANALYZED_COLUMNS = ['Transaction ID', 'Item', 'Quantity', 'Price Per Unit', 'Total Spent',
+                    'Payment Method', 'Location', 'Transaction Date']
+
+# Report name -> whether its index is written to the CSV
+REPORT_FILES = {
+    'summary': False,
+    'product_metrics': True,
+    'monthly_revenue': False,
+    'daily_patterns': True,
+    'payment_analysis': True,
+    'location_analysis': True,
+    'hourly_heatmap_data': True,
+}
+
+
+def load_transactions(path=None):
+    """
+    Load the cleaned transactions and prepare them for analysis.
+
+    path defaults to the freshest copy of cleaned_cafe_sales (Parquet,
+    Feather or CSV).
+    """
+    path = path or find_dataset("cleaned_cafe_sales.csv")
+    df = load_sales(path, compact=True)
+    # Money and quantities are stored compactly; aggregate them in float64 so totals and means keep full precision
+    df[MONEY_COLUMNS + ['Quantity']] = df[MONEY_COLUMNS + ['Quantity']].astype('float64')
+    return prepare_transactions(df)
+
+
+def prepare_transactions(df):
+    # Calendar fields are not stored: the reports derive them from the date
+    df = df.drop(columns=[column for column in CALENDAR_FIELDS if column in df])
+    df = df.drop_duplicates()
+    df = df.dropna()
+    df['Transaction Date'] = pd.to_datetime(df['Transaction Date'])
+    return df
+
+
+def compute_overview(df):
+    """
+    Headline figures of the transactions, as printed and saved in the summary
+    """
+    return {
+        'rows': len(df),
+        'revenue': df['Total Spent'].sum(),
+        'transactions': df['Transaction ID'].nunique(),
+        'items': df['Item'].nunique(),
+        'first_date': df['Transaction Date'].min(),
+        'last_date': df['Transaction Date'].max(),
+    }
+
+
+def compute_cube_overview(cube):
+    """
+    compute_overview from a sales cube (Transaction Count adds up because cleaned IDs are unique)
+    """
+    return {
+        'rows': int(cube['Row Count'].sum()),
+        'revenue': cube['Total Spent'].sum(),
+        'transactions': int(cube['Transaction Count'].sum()),
+        'items': cube['Item'].nunique(),
+        'first_date': cube['Transaction Date'].min(),
+        'last_date': cube['Transaction Date'].max(),
+    }
+
+
+def compute_summary(overview):
+    return pd.DataFrame({
+        'Metric': ['Total Revenue', 'Total Transactions', 'Unique Items', 'Date Range'],
+        'Value': [
+            f"${overview['revenue']:,.2f}",
+            f"{overview['transactions']:,}",
+            f"{overview['items']}",
+            f"{overview['first_date'].date()} to {overview['last_date'].date()}"
+        ]
+    })
+
+
+def compute_monthly_revenue(df):
+    dates = df['Transaction Date']
+    monthly_revenue = df.assign(Year=dates.dt.year, Month=dates.dt.month_name()).groupby(
+        ['Year', 'Month', pd.Grouper(key='Transaction Date', freq='M')])['Total Spent'].sum().reset_index()
+    return monthly_revenue.sort_values('Transaction Date')
+
+
+def compute_daily_patterns(df):
+    day_of_week = calendar_field(df, 'DayOfWeek')
+    return df.groupby(day_of_week)['Total Spent'].agg(['sum', 'count', 'mean']).reindex(DAY_ORDER)
+
+
+def compute_product_metrics(df):
+    product_metrics = df.groupby('Item', observed=True).agg({
+        'Quantity': 'sum',
+        'Total Spent': 'sum',
+        'Transaction ID': 'count'
+    }).sort_values('Total Spent', ascending=False)
+
+    product_metrics['Avg. Price'] = product_metrics['Total Spent'] / product_metrics['Quantity']
+    product_metrics['Avg. Transaction Value'] = product_metrics['Total Spent'] / product_metrics['Transaction ID']
+    return product_metrics
 
-currency_format = FuncFormatter(currency)
-
-# 1. Load and prepare the data
-print("🚀 Loading and preparing cafe sales data...")
-df = pd.read_csv("cleaned_cafe_sales.csv")
-original_count = len(df)
-
-# Data cleaning
-df = df.drop_duplicates()
-df = df.dropna()
-df['Transaction Date'] = pd.to_datetime(df['Transaction Date'])
-df['DayOfWeek'] = df['Transaction Date'].dt.day_name()
-df['Month'] = df['Transaction Date'].dt.month_name()
-df['Year'] = df['Transaction Date'].dt.year
-
-# 2. Basic Data Exploration
-print("\n📊 === Basic Data Exploration ===")
-print(f"\n📈 Total records: {len(df):,}")
-print(f"📅 Date range: {df['Transaction Date'].min().date()} to {df['Transaction Date'].max().date()}")
-print(f"💰 Total Revenue: ${df['Total Spent'].sum():,.2f}")
-print(f"🛒 Total Transactions: {df['Transaction ID'].nunique():,}")
-print(f"🍽️ Unique Items Sold: {df['Item'].nunique()}")
-
-# 3. Time-based Analysis
-print("\n⏰ === Time-based Analysis ===")
-monthly_revenue = df.groupby(['Year', 'Month', pd.Grouper(key='Transaction Date', freq='M')])['Total Spent'].sum().reset_index()
-monthly_revenue = monthly_revenue.sort_values('Transaction Date')
-
-# Daily patterns
-daily_patterns = df.groupby('DayOfWeek')['Total Spent'].agg(['sum', 'count', 'mean']).reindex([
-    'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
-])
-
-# 4. Product Analysis
-print("\n🍕 === Product Analysis ===")
-product_metrics = df.groupby('Item').agg({
-    'Quantity': 'sum',
-    'Total Spent': 'sum',
-    'Transaction ID': 'count'
-}).sort_values('Total Spent', ascending=False)
-
-product_metrics['Avg. Price'] = product_metrics['Total Spent'] / product_metrics['Quantity']
-product_metrics['Avg. Transaction Value'] = product_metrics['Total Spent'] / product_metrics['Transaction ID']
-
-# 5. Customer Behavior Analysis
-print("\n👥 === Customer Behavior Analysis ===")
-payment_analysis = df.groupby('Payment Method').agg({
-    'Total Spent': ['sum', 'mean', 'count']
-}).sort_values(('Total Spent', 'sum'), ascending=False)
-
-location_analysis = df.groupby('Location').agg({
-    'Total Spent': ['sum', 'mean', 'count']
-}).sort_values(('Total Spent', 'sum'), ascending=False)
-
-# 6. Visualization
-print("\n🎨 Generating visualizations...")
-plt.figure(figsize=(18, 22))
-
-# Plot 1: Monthly Revenue Trend
-plt.subplot(4, 2, 1)
-sns.lineplot(x='Transaction Date', y='Total Spent', data=monthly_revenue, marker='o')
-plt.title('Monthly Revenue Trend', fontweight='bold')
-plt.xticks(rotation=45)
-plt.gca().yaxis.set_major_formatter(currency_format)
-
-# Plot 2: Daily Revenue by Day of Week
-plt.subplot(4, 2, 2)
-sns.barplot(x=daily_patterns.index, y='sum', data=daily_patterns.reset_index())
-plt.title('Total Revenue by Day of Week', fontweight='bold')
-plt.xticks(rotation=45)
-plt.gca().yaxis.set_major_formatter(currency_format)
-
-# Plot 3: Top Selling Items by Revenue
-plt.subplot(4, 2, 3)
-top_items = product_metrics.head(5)
-sns.barplot(x=top_items.index, y='Total Spent', data=top_items.reset_index())
-plt.title('Top 5 Items by Revenue', fontweight='bold')
-plt.xticks(rotation=45, ha='right')
-plt.gca().yaxis.set_major_formatter(currency_format)
-
-# Plot 4: Payment Method Analysis
-plt.subplot(4, 2, 4)
-sns.barplot(x=payment_analysis.index, y=('Total Spent', 'mean'), 
-            data=payment_analysis.reset_index())
-plt.title('Average Transaction by Payment Method', fontweight='bold')
-plt.xticks(rotation=45)
-plt.gca().yaxis.set_major_formatter(currency_format)
-
-# Plot 5: Location Analysis
-plt.subplot(4, 2, 5)
-sns.barplot(x=location_analysis.index, y=('Total Spent', 'count'), 
-            data=location_analysis.reset_index())
-plt.title('Number of Transactions by Location', fontweight='bold')
-plt.xticks(rotation=45)
-
-# Plot 6: Price Distribution by Item
-plt.subplot(4, 2, 6)
-sns.boxplot(x='Item', y='Price Per Unit', data=df)
-plt.title('Price Distribution by Item', fontweight='bold')
-plt.xticks(rotation=90)
-
-# Plot 7: Heatmap of Sales by Day and Hour
-plt.subplot(4, 2, 7)
-df['Hour'] = df['Transaction Date'].dt.hour
-heatmap_data = df.pivot_table(
-    index='DayOfWeek', 
-    columns='Hour', 
-    values='Total Spent', 
-    aggfunc='sum',
-    fill_value=0
-).reindex([
-    'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
-])
-sns.heatmap(heatmap_data, cmap='YlGnBu', linewidths=.5)
-plt.title('Sales Heatmap: Day of Week vs Hour', fontweight='bold')
-plt.tight_layout()
-plt.savefig('analysis_results/cafe_sales_analysis.png', dpi=300, bbox_inches='tight')
-
-# 7. Save Detailed Analysis to CSV files
-print("\n💾 Saving detailed analysis to CSV files...")
-
-# Save summary data
-summary_data = {
-    'Metric': ['Total Revenue', 'Total Transactions', 'Unique Items', 'Date Range'],
-    'Value': [
-        f"${df['Total Spent'].sum():,.2f}",
-        f"{df['Transaction ID'].nunique():,}",
-        f"{df['Item'].nunique()}",
-        f"{df['Transaction Date'].min().date()} to {df['Transaction Date'].max().date()}"
+
+def compute_payment_analysis(df):
+    return df.groupby('Payment Method', observed=True).agg({
+        'Total Spent': ['sum', 'mean', 'count']
+    }).sort_values(('Total Spent', 'sum'), ascending=False)
+
+
+def compute_location_analysis(df):
+    return df.groupby('Location', observed=True).agg({
+        'Total Spent': ['sum', 'mean', 'count']
+    }).sort_values(('Total Spent', 'sum'), ascending=False)
+
+
+def compute_analyzed_transactions(df):
+    """
+    The transactions as saved for the dashboard and the Power BI export
+    """
+    return df[ANALYZED_COLUMNS].assign(**{
+        'Transaction ID': decode_transaction_ids(df['Transaction ID']).to_numpy(),
+        'Month': df['Transaction Date'].dt.strftime('%Y-%m'),
+        'DayOfWeek': calendar_field(df, 'DayOfWeek'),
+    })
+
+
+def _build_reports(data, builders):
+    reports = {}
+    for name, build in builders.items():
+        with stage(name, len(data)) as building:
+            reports[name] = build(data)
+            building.rows_out = len(reports[name])
+    return reports
+
+
+def compute_reports(df):
+    """
+    Every report written to analysis_results, keyed by file name
+    """
+    return _build_reports(df, {
+        'summary': lambda df: compute_summary(compute_overview(df)),
+        'product_metrics': compute_product_metrics,
+        'monthly_revenue': compute_monthly_revenue,
+        'daily_patterns': compute_daily_patterns,
+        'payment_analysis': compute_payment_analysis,
+        'location_analysis': compute_location_analysis,
+        'hourly_heatmap_data': sales_cube.hour_weekday_grid,
+    })
+
+
+def compute_cube_reports(cube):
+    """
+    compute_reports from a sales cube instead of the transactions
+    """
+    return _build_reports(cube, {
+        'summary': lambda cube: compute_summary(compute_cube_overview(cube)),
+        'product_metrics': sales_cube.product_metrics,
+        'monthly_revenue': sales_cube.monthly_revenue,
+        'daily_patterns': sales_cube.daily_patterns,
+        'payment_analysis': lambda cube: sales_cube.spend_breakdown(cube, 'Payment Method'),
+        'location_analysis': lambda cube: sales_cube.spend_breakdown(cube, 'Location'),
+        'hourly_heatmap_data': sales_cube.hour_weekday_grid,
+    })
+
+
+def compute_key_insights(reports, n_rows):
+    """
+    Key insight lines (without bullets) from the reports of n_rows transactions
+    """
+    daily_patterns = reports['daily_patterns']
+    product_metrics = reports['product_metrics']
+    payment_analysis = reports['payment_analysis']
+    location_analysis = reports['location_analysis']
+    return [
+        f"Highest Revenue Day: {daily_patterns['sum'].idxmax()} (${daily_patterns['sum'].max():,.2f})",
+        f"Busiest Day: {daily_patterns['count'].idxmax()} ({daily_patterns['count'].max():,} transactions)",
+        f"Top Selling Item: {product_metrics.index[0]} (${product_metrics['Total Spent'].iloc[0]:,.2f})",
+        f"Most Popular Payment: {payment_analysis.index[0]} ({(payment_analysis[('Total Spent', 'count')].iloc[0] / n_rows)*100:.1f}% of transactions)",
+        f"Most Common Location: {location_analysis.index[0]} ({(location_analysis[('Total Spent', 'count')].iloc[0] / n_rows)*100:.1f}% of transactions)",
     ]
+
+
+def compute_price_counts(df):
+    """
+    Number of rows at each Item and Price Per Unit
+    """
+    return df.groupby(['Item', 'Price Per Unit'], observed=True).size().rename('Count').reset_index()
+
+
+def _weighted_quantile(values, counts, q):
+    # values sorted ascending, each repeated counts times; linear interpolation
+    # between the two nearest ranks, as numpy.percentile does by default
+    position = (counts.sum() - 1) * q
+    cumulative = np.cumsum(counts)
+    below = values[np.searchsorted(cumulative, np.floor(position), side='right')]
+    above = values[np.searchsorted(cumulative, np.ceil(position), side='right')]
+    return below + (above - below) * (position - np.floor(position))
+
+
+def compute_price_quantiles(price_counts):
+    """
+    Box plot statistics of Price Per Unit per Item, as matplotlib's bxp expects them.
+
+    Works from compute_price_counts (a handful of rows per item) rather than
+    the transactions. Whiskers reach the furthest price within 1.5 IQR of
+    the box, but never into it (as matplotlib.cbook.boxplot_stats clamps
+    them), and prices beyond them are kept as fliers (only their distinct
+    values, since a flier drawn twice looks the same).
+    """
+    stats = {}
+    for item, group in price_counts.groupby('Item', observed=True):
+        group = group.sort_values('Price Per Unit')
+        values = group['Price Per Unit'].to_numpy(dtype='float64')
+        counts = group['Count'].to_numpy()
+        q1, med, q3 = (_weighted_quantile(values, counts, q) for q in (0.25, 0.5, 0.75))
+        inside = (values >= q1 - 1.5 * (q3 - q1)) & (values <= q3 + 1.5 * (q3 - q1))
+        stats[item] = {
+            'q1': q1, 'med': med, 'q3': q3,
+            'whislo': min(values[inside].min(), q1), 'whishi': max(values[inside].max(), q3),
+            'fliers': values[~inside].tolist(),
+        }
+    return pd.DataFrame.from_dict(stats, orient='index').rename_axis('Item')
+
+
+def compute_chart_data(price_counts, reports, charts=None):
+    """
+    The aggregate each chart is drawn from, for the charts named in charts (default: all)
+    """
+    sources = {
+        'monthly_revenue_trend': lambda: reports['monthly_revenue'][['Transaction Date', 'Total Spent']],
+        'revenue_by_day': lambda: reports['daily_patterns']['sum'],
+        'top_items': lambda: reports['product_metrics']['Total Spent'].head(5),
+        'payment_average': lambda: reports['payment_analysis'][('Total Spent', 'mean')],
+        'location_transactions': lambda: reports['location_analysis'][('Total Spent', 'count')],
+        'price_distribution': lambda: compute_price_quantiles(price_counts),
+        'sales_heatmap': lambda: reports['hourly_heatmap_data'],
+    }
+    return {name: sources[name]() for name in (charts or CHARTS)}
+
+
+def _currency(x, pos):
+    return f'${x:,.2f}'
+
+
+def _bar_chart(ax, data, rotation=45, ha='center', currency=True):
+    import seaborn as sns
+    sns.barplot(x=data.index.astype(str), y=data.to_numpy(), ax=ax)
+    ax.tick_params(axis='x', labelrotation=rotation)
+    for label in ax.get_xticklabels():
+        label.set_ha(ha)
+    if currency:
+        from matplotlib.ticker import FuncFormatter
+        ax.yaxis.set_major_formatter(FuncFormatter(_currency))
+
+
+def _draw_monthly_revenue_trend(ax, data):
+    import seaborn as sns
+    from matplotlib.ticker import FuncFormatter
+    sns.lineplot(x='Transaction Date', y='Total Spent', data=data, marker='o', ax=ax)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.yaxis.set_major_formatter(FuncFormatter(_currency))
+
+
+def _draw_price_distribution(ax, data):
+    import seaborn as sns
+    boxes = [{'label': str(item), **row} for item, row in data.to_dict('index').items()]
+    ax.bxp(boxes, patch_artist=True, boxprops={'facecolor': sns.color_palette()[0]},
+           medianprops={'color': 'black'})
+    ax.set_xlabel('Item')
+    ax.set_ylabel('Price Per Unit')
+    ax.tick_params(axis='x', labelrotation=90)
+
+
+def _draw_sales_heatmap(ax, data):
+    import seaborn as sns
+    sns.heatmap(data, cmap='YlGnBu', linewidths=.5, ax=ax)
+
+
+# Chart name -> (title, drawing function); also the order of the tiles in the combined figure
+CHARTS = {
+    'monthly_revenue_trend': ('Monthly Revenue Trend', _draw_monthly_revenue_trend),
+    'revenue_by_day': ('Total Revenue by Day of Week', _bar_chart),
+    'top_items': ('Top 5 Items by Revenue', lambda ax, data: _bar_chart(ax, data, ha='right')),
+    'payment_average': ('Average Transaction by Payment Method', _bar_chart),
+    'location_transactions': ('Number of Transactions by Location',
+                              lambda ax, data: _bar_chart(ax, data, currency=False)),
+    'price_distribution': ('Price Distribution by Item', _draw_price_distribution),
+    'sales_heatmap': ('Sales Heatmap: Day of Week vs Hour', _draw_sales_heatmap),
 }
-pd.DataFrame(summary_data).to_csv('analysis_results/summary.csv', index=False)
-
-# Save other analysis results
-product_metrics.to_csv('analysis_results/product_metrics.csv')
-monthly_revenue.to_csv('analysis_results/monthly_revenue.csv', index=False)
-daily_patterns.to_csv('analysis_results/daily_patterns.csv')
-payment_analysis.to_csv('analysis_results/payment_analysis.csv')
-location_analysis.to_csv('analysis_results/location_analysis.csv')
-
-# Save the heatmap data
-heatmap_data.to_csv('analysis_results/hourly_heatmap_data.csv')
-
-# 8. Print Key Insights
-print("\n🔍 === Key Insights ===")
-print(f"\n💰 Highest Revenue Day: {daily_patterns['sum'].idxmax()} (${daily_patterns['sum'].max():,.2f})")
-print(f"🛒 Busiest Day: {daily_patterns['count'].idxmax()} ({daily_patterns['count'].max():,} transactions)")
-print(f"🏆 Top Selling Item: {product_metrics.index[0]} (${product_metrics['Total Spent'].iloc[0]:,.2f})")
-print(f"💳 Most Popular Payment: {payment_analysis.index[0]} ({(payment_analysis[('Total Spent', 'count')].iloc[0] / len(df))*100:.1f}% of transactions)")
-print(f"📍 Most Common Location: {location_analysis.index[0]} ({(location_analysis[('Total Spent', 'count')].iloc[0] / len(df))*100:.1f}% of transactions)")
-
-# 9. Save key insights to a text file
-with open('analysis_results/key_insights.txt', 'w') as f:
-    f.write("=== Key Insights ===\n\n")
-    f.write(f"• Highest Revenue Day: {daily_patterns['sum'].idxmax()} (${daily_patterns['sum'].max():,.2f})\n")
-    f.write(f"• Busiest Day: {daily_patterns['count'].idxmax()} ({daily_patterns['count'].max():,} transactions)\n")
-    f.write(f"• Top Selling Item: {product_metrics.index[0]} (${product_metrics['Total Spent'].iloc[0]:,.2f})\n")
-    f.write(f"• Most Popular Payment: {payment_analysis.index[0]} ({(payment_analysis[('Total Spent', 'count')].iloc[0] / len(df))*100:.1f}% of transactions)\n")
-    f.write(f"• Most Common Location: {location_analysis.index[0]} ({(location_analysis[('Total Spent', 'count')].iloc[0] / len(df))*100:.1f}% of transactions)\n")
-
-print("\n✅ Analysis complete! Check the 'analysis_results' folder for all CSV files and visualizations.")
-print("📂 Files created:")
-print(f"   • analysis_results/summary.csv")
-print(f"   • analysis_results/product_metrics.csv")
-print(f"   • analysis_results/monthly_revenue.csv")
-print(f"   • analysis_results/daily_patterns.csv")
-print(f"   • analysis_results/payment_analysis.csv")
-print(f"   • analysis_results/location_analysis.csv")
-print(f"   • analysis_results/hourly_heatmap_data.csv")
-print(f"   • analysis_results/key_insights.txt")
-print(f"   • analysis_results/cafe_sales_analysis.png")
+CHART_DIR = 'charts'
+# Size of one chart tile in inches; every tile has the same size so they can be stitched
+CHART_SIZE = (9, 5.5)
+# Bump when the drawing code changes so cached charts are redrawn
+CHART_VERSION = 1
+
+
+def chart_digest(name, data, dpi):
+    """
+    Hash of everything a chart depends on: its input aggregate, its resolution and the drawing code version
+    """
+    digest = hashlib.sha256(f'{name}:{dpi}:v{CHART_VERSION}:'.encode())
+    digest.update(data.to_csv().encode())
+    return digest.hexdigest()
+
+
+def render_chart(name, data, path, dpi=300):
+    """
+    Draw one chart to path on the Agg backend; safe to run in a worker process
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set_theme(style="whitegrid")
+    plt.rcParams['font.size'] = 12
+
+    title, draw = CHARTS[name]
+    with stage(f'plot {name}', len(data), len(data)):
+        fig, ax = plt.subplots(figsize=CHART_SIZE)
+        draw(ax, data)
+        ax.set_title(title, fontweight='bold')
+        fig.tight_layout()
+        tmp_path = f'{path}.{os.getpid()}.tmp.png'
+        fig.savefig(tmp_path, dpi=dpi)
+        plt.close(fig)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _render_chart_job(name, data, path, dpi, profiled):
+    # Runs in a worker process; returns the stages it recorded
+    if not profiled:
+        render_chart(name, data, path, dpi)
+        return []
+    return run_profiled(render_chart, name, data, path, dpi)[1]
+
+
+def render_charts(chart_data, output_dir=OUTPUT_DIR, dpi=300, workers=None):
+    """
+    Render every chart in chart_data to output_dir/charts/<name>.png, in parallel.
+
+    A chart whose input aggregate and resolution are unchanged since it was
+    last rendered (per the .sha256 file kept next to it) is not redrawn.
+    Returns (chart paths in CHARTS order, number of charts redrawn).
+    """
+    chart_dir = os.path.join(output_dir, CHART_DIR)
+    os.makedirs(chart_dir, exist_ok=True)
+
+    paths, jobs = [], []
+    for name, data in chart_data.items():
+        path = os.path.join(chart_dir, f'{name}.png')
+        digest = chart_digest(name, data, dpi)
+        digest_path = path + '.sha256'
+        paths.append(path)
+        if os.path.exists(path) and os.path.exists(digest_path):
+            with open(digest_path) as f:
+                if f.read() == digest:
+                    continue
+        jobs.append((name, data, path, digest, digest_path))
+
+    if jobs:
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        if workers > 1:
+            # Each worker sends back the stages it recorded, nested under the pool's stage
+            profiled = profiling_enabled()
+            with stage(f'plot {len(jobs)} charts in {workers} processes', len(jobs), len(jobs)), \
+                    ProcessPoolExecutor(max_workers=workers) as pool:
+                for records in pool.map(_render_chart_job, *zip(*[(name, data, path, dpi, profiled)
+                                                                   for name, data, path, _, _ in jobs])):
+                    add_records(records)
+        else:
+            for name, data, path, _, _ in jobs:
+                render_chart(name, data, path, dpi)
+        for _, _, _, digest, digest_path in jobs:
+            with open(digest_path, 'w') as f:
+                f.write(digest)
+    return paths, len(jobs)
+
+
+def stitch_charts(paths, path, columns=2):
+    """
+    Combine chart tiles into one figure, row by row
+    """
+    from PIL import Image
+
+    tiles = [Image.open(tile) for tile in paths]
+    width = max(tile.width for tile in tiles)
+    height = max(tile.height for tile in tiles)
+    rows = -(-len(tiles) // columns)
+    combined = Image.new('RGB', (width * columns, height * rows), 'white')
+    for i, tile in enumerate(tiles):
+        combined.paste(tile.convert('RGB'), ((i % columns) * width, (i // columns) * height))
+        tile.close()
+    combined.save(path)
+    return path
+
+
+def save_reports(reports, key_insights, output_dir=OUTPUT_DIR, writer=None):
+    """
+    Write the report CSVs and key_insights.txt; returns their paths.
+
+    The files are queued on writer (a ReportWriter), or written concurrently
+    by a ReportWriter of their own when none is given.
+    """
+    own_writer = writer is None
+    if own_writer:
+        writer = ReportWriter(output_dir)
+    written = []
+    for name, frame in reports.items():
+        path = os.path.join(output_dir, f'{name}.csv')
+        writer.write_csv(path, frame, index=REPORT_FILES[name])
+        written.append(path)
+
+    path = os.path.join(output_dir, 'key_insights.txt')
+    writer.write_text(path, "=== Key Insights ===\n\n" + ''.join(f"• {line}\n" for line in key_insights))
+    written.append(path)
+    if own_writer:
+        with stage(f'write {len(writer)} files', len(writer)) as writing:
+            writing.rows_out = sum(bool(replaced) for replaced in writer.close().values())
+            add_records(writer.stage_records())
+    return written
+
+
+def print_key_insights(key_insights):
+    print("\n🔍 === Key Insights ===")
+    for icon, line in zip(['\n💰', '🛒', '🏆', '💳', '📍'], key_insights):
+        print(f"{icon} {line}")
+
+
+def run_pipeline(source=None, output_dir=OUTPUT_DIR, charts=None, dpi=300, workers=None, db=None,
+                 analyzed_path='analyzed_cafe_sales.csv'):
+    """
+    Run the full analysis: load, compute every report, plot, and save everything.
+
+    charts names the charts to render (default: all of CHARTS, an empty list
+    renders none). With db (a TransactionStore file) the aggregates are
+    computed in SQL and no transaction is loaded into memory. The analyzed
+    transactions go to analyzed_path, in the format of the source. Returns
+    the reports dict.
+    """
+    # 1. Load and prepare the data
+    if db:
+        print(f"🚀 Aggregating cafe sales data in {db}...")
+        store = TransactionStore(db)
+        df = None
+        with stage('sql cube') as loading:
+            cube = store.cube()
+            loading.rows_out = len(cube)
+        with stage('sql price counts') as counting:
+            price_counts = store.price_counts()
+            counting.rows_out = len(price_counts)
+        store.close()
+        overview = compute_cube_overview(cube)
+    else:
+        print("🚀 Loading and preparing cafe sales data...")
+        source = source or find_dataset("cleaned_cafe_sales.csv")
+        with stage('load') as loading:
+            df = load_transactions(source)
+            loading.rows_out = len(df)
+        overview = compute_overview(df)
+
+    # 2. Basic Data Exploration
+    print("\n📊 === Basic Data Exploration ===")
+    print(f"\n📈 Total records: {overview['rows']:,}")
+    print(f"📅 Date range: {overview['first_date'].date()} to {overview['last_date'].date()}")
+    print(f"💰 Total Revenue: ${overview['revenue']:,.2f}")
+    print(f"🛒 Total Transactions: {overview['transactions']:,}")
+    print(f"🍽️ Unique Items Sold: {overview['items']}")
+
+    # 3-5. Time-based, product and customer behavior analysis
+    print("\n📐 Computing time-based, product and customer behavior reports...")
+    if db:
+        reports = compute_cube_reports(cube)
+    else:
+        reports = compute_reports(df)
+        with stage('price_counts', len(df)) as counting:
+            price_counts = compute_price_counts(df)
+            counting.rows_out = len(price_counts)
+    key_insights = compute_key_insights(reports, overview['rows'])
+
+    # Every output below is queued on a pool of writer threads, written to a
+    # temporary file and moved into place; files whose content did not change
+    # are left alone, and analysis_results/manifest.json records their hashes
+    writer = ReportWriter(output_dir)
+
+    # 6. Visualization
+    written = []
+    if charts is None or charts:
+        print("\n🎨 Generating visualizations...")
+        with stage('chart data') as preparing:
+            chart_data = compute_chart_data(price_counts, reports, charts)
+            preparing.rows_out = sum(len(data) for data in chart_data.values())
+        chart_paths, redrawn = render_charts(chart_data, output_dir, dpi, workers)
+        print(f"   {redrawn} of {len(chart_paths)} charts redrawn, the rest were unchanged")
+        # The combined figure also takes the tiles of charts that were not selected this time
+        chart_dir = os.path.join(output_dir, CHART_DIR)
+        tiles = [os.path.join(chart_dir, f'{name}.png') for name in CHARTS]
+        tiles = [tile for tile in tiles if os.path.exists(tile)]
+        combined_path = os.path.join(output_dir, 'cafe_sales_analysis.png')
+        writer.submit(combined_path, lambda tmp_path: stitch_charts(tiles, tmp_path))
+        written.append(combined_path)
+        for path in chart_paths:
+            writer.record(path)
+        written += chart_paths
+
+    # 7. Save detailed analysis to CSV files
+    print("\n💾 Saving detailed analysis to CSV files...")
+    written = save_reports(reports, key_insights, output_dir, writer) + written
+
+    # Save the analyzed transactions for the dashboard and the Power BI export,
+    # in the same format as the cleaned data they came from (the dashboard
+    # reads them straight from the database instead)
+    if df is not None:
+        analyzed_format = FORMATS.get(os.path.splitext(source)[1], 'csv')
+        if not columnar_available():
+            analyzed_format = 'csv'
+        with stage('analyzed_cafe_sales', len(df)) as preparing:
+            analyzed = compute_analyzed_transactions(df)
+            preparing.rows_out = len(analyzed)
+        path = path_for_format(analyzed_path, analyzed_format)
+        writer.submit(path, lambda tmp_path: save_sales(analyzed, tmp_path), len(analyzed))
+        written.append(path)
+
+    # Each job is also recorded with the time its thread spent on it; rows_out counts the files replaced
+    with stage(f'write {len(writer)} files in {writer.workers} threads', len(writer)) as writing:
+        replaced = writer.close()
+        writing.rows_out = sum(bool(value) for value in replaced.values())
+        add_records(writer.stage_records())
+
+    # 8. Print Key Insights
+    print_key_insights(key_insights)
+
+    print(f"\n✅ Analysis complete! Check the '{output_dir}' folder for all CSV files and visualizations.")
+    print("📂 Files created:")
+    for path in written:
+        print(f"   • {path}" + (" (unchanged)" if replaced[path] is False else ""))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze cleaned cafe sales data")
+    parser.add_argument('--input', help="Cleaned dataset (default: freshest cleaned_cafe_sales.*)")
+    parser.add_argument('--db', help="Aggregate the transactions in this SQLite store instead of loading them")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="Where the reports are written")
+    parser.add_argument('--charts', nargs='+', choices=list(CHARTS),
+                        help="Charts to render (default: all)")
+    parser.add_argument('--no-charts', action='store_true', help="Skip rendering the charts")
+    parser.add_argument('--dpi', type=int, default=300, help="Resolution of the charts")
+    parser.add_argument('--chart-workers', type=int,
+                        help="Processes rendering charts in parallel (default: one per CPU)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    start_profiling('analyze', args.profile, args.cprofile)
+    charts = [] if args.no_charts else args.charts
+    run_pipeline(args.input, args.output_dir, charts, args.dpi, args.chart_workers, args.db)
+    for path in finish_profiling():
+        print(f"📈 Profile written to '{path}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Clean many dirty sales files (one per store per day) in parallel.
+
+Every input file is cleaned with clean_sales_data in a process pool. The
+result for each file is cached under its content hash, so files that did
+not change since the last run are not parsed again. The per-file results
+are then merged in file-name order with Transaction IDs de-duplicated
+across all files, and every row is tagged with the store it came from.
+
+    python batch_clean.py exports/ --workers 8
+    python batch_clean.py "exports/*/2024-06-*.csv" --output cleaned_cafe_sales.parquet
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from clean_cafe_sales import CLEANING_VERSION, SeenTransactionIds, clean_sales_data
+from sales_storage import SalesWriter
+
+CACHE_DIR = '.clean_cache'
+# Bump when the layout of the cached results changes; cleaning rule changes
+# are picked up from clean_cafe_sales.CLEANING_VERSION
+CACHE_VERSION = 2
+# Default store tag: the file name up to the first underscore (store12_2024-06-01.csv -> store12)
+STORE_PATTERN = r'^(?P<store>[^_]+)'
+
+
+def expand_inputs(inputs):
+    """
+    Turn a list of files, directories and glob patterns into a sorted list of CSV files
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '**', '*.csv'), recursive=True))
+        elif os.path.exists(item):
+            paths.add(item)
+        else:
+            paths.update(glob.glob(item, recursive=True))
+    return sorted(paths)
+
+
+def store_from_path(path, pattern=STORE_PATTERN):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = re.search(pattern, stem)
+    return match.group('store') if match else stem
+
+
+def file_digest(path):
+    digest = hashlib.sha256(f'v{CACHE_VERSION}:rules{CLEANING_VERSION}:'.encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clean_file(path, cache_dir=CACHE_DIR):
+    """
+    Clean one file, or reuse the cached result for identical content.
+
+    Runs in a worker process; returns (path, cache file, whether the cache
+    was hit) so only a few strings cross back to the parent. The number of
+    raw rows is kept in the cached frame's attrs.
+    """
+    cache_path = os.path.join(cache_dir, file_digest(path) + '.pkl')
+    if os.path.exists(cache_path):
+        return path, cache_path, True
+
+    raw = pd.read_csv(path)
+    cleaned = clean_sales_data(raw)
+    cleaned.attrs['rows_in'] = len(raw)
+
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    cleaned.to_pickle(tmp_path)
+    os.replace(tmp_path, cache_path)
+    return path, cache_path, False
+
+
+def clean_files(paths, output_path, workers=None, cache_dir=CACHE_DIR, store_pattern=STORE_PATTERN):
+    """
+    Clean paths in parallel and merge them into output_path.
+
+    Returns (rows read, rows written, files served from the cache).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    seen_ids = SeenTransactionIds()
+    writer = SalesWriter(output_path)
+    rows_in = rows_out = cache_hits = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in input order, so the first file holding an ID keeps it
+        for path, cache_path, cached in pool.map(clean_file, paths, [cache_dir] * len(paths)):
+            cleaned = pd.read_pickle(cache_path)
+            rows_in += cleaned.attrs['rows_in']
+
+            cleaned = cleaned[seen_ids.add_new(cleaned['Transaction ID'])]
+            cleaned = cleaned.assign(Store=store_from_path(path, store_pattern))
+            writer.write(cleaned)
+
+            rows_out += len(cleaned)
+            cache_hits += cached
+    writer.close()
+    return rows_in, rows_out, cache_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a batch of dirty cafe sales files in parallel")
+    parser.add_argument('inputs', nargs='+', help="Dirty CSV files, directories or glob patterns")
+    parser.add_argument('--output', default='cleaned_cafe_sales.csv',
+                        help="Merged output (.csv, .parquet or .feather)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Where per-file results are cached")
+    parser.add_argument('--store-pattern', default=STORE_PATTERN,
+                        help="Regex with a 'store' group, matched against each file name to tag its rows")
+    args = parser.parse_args()
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("❌ No input files found.")
+        return
+
+    start = time.perf_counter()
+    rows_in, rows_out, cache_hits = clean_files(paths, args.output, args.workers, args.cache_dir,
+                                                args.store_pattern)
+    elapsed = time.perf_counter() - start
+
+    print(f"Data cleaning complete. Cleaned data saved as '{args.output}'")
+    print("\nCleaning Summary:")
+    print(f"Files processed: {len(paths)} ({cache_hits} unchanged, taken from the cache)")
+    print(f"Original number of rows: {rows_in}")
+    print(f"Number of rows after cleaning: {rows_out}")
+    print(f"Number of rows removed: {rows_in - rows_out}")
+    print(f"Elapsed: {elapsed:.1f}s ({rows_in / elapsed:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark the cleaning engine in clean_cafe_sales.py.
+
+Builds synthetic dirty frames of the requested sizes by resampling rows of
+dirty_cafe_sales.csv (with fresh Transaction IDs) and reports rows/sec for
+the columnar cleaner. With --legacy the old row-wise implementation is timed
+as well on sizes up to --legacy-max-rows, and its output is checked against
+the columnar one row for row.
+
+    python benchmark_cleaning.py --sizes 10000 1000000 10000000
+"""
+import argparse
+import time
+import pandas as pd
+import numpy as np
+
+from clean_cafe_sales import clean_sales_data, PLACEHOLDERS, VALID_ITEMS, VALID_PAYMENTS, VALID_LOCATIONS, ESSENTIAL_COLUMNS
+
+
+def legacy_clean_sales_data(df):
+    """
+    The original row-wise cleaner, kept here as the reference implementation
+    """
+    df = df.replace(PLACEHOLDERS, np.nan)
+    df['Item'] = df['Item'].where(df['Item'].isin(VALID_ITEMS), other=np.nan)
+    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
+    df['Price Per Unit'] = pd.to_numeric(df['Price Per Unit'], errors='coerce')
+
+    def clean_currency(x):
+        if pd.isna(x):
+            return np.nan
+        try:
+            return float(x)
+        except:
+            return np.nan
+
+    df['Total Spent'] = df['Total Spent'].apply(clean_currency)
+
+    def calculate_total_spent(row):
+        if pd.notna(row['Quantity']) and pd.notna(row['Price Per Unit']):
+            calculated = row['Quantity'] * row['Price Per Unit']
+            if pd.isna(row['Total Spent']) or (row['Total Spent'] != calculated):
+                return calculated
+        return row['Total Spent']
+
+    df['Total Spent'] = df.apply(calculate_total_spent, axis=1)
+    df['Payment Method'] = df['Payment Method'].where(df['Payment Method'].isin(VALID_PAYMENTS), other=np.nan)
+    df['Location'] = df['Location'].where(df['Location'].isin(VALID_LOCATIONS), other=np.nan)
+
+    def clean_date(date_str):
+        if pd.isna(date_str):
+            return np.nan
+        try:
+            return pd.to_datetime(date_str, format='%Y-%m-%d')
+        except:
+            return np.nan
+
+    df['Transaction Date'] = df['Transaction Date'].apply(clean_date)
+    df = df.dropna(subset=ESSENTIAL_COLUMNS, how='all')
+    df = df.drop_duplicates('Transaction ID')
+    df = df[df['Transaction ID'].notna()]
+    df['Transaction ID'] = df['Transaction ID'].astype(str)
+    return df
+
+
+def make_dirty_frame(source, n_rows, seed=42):
+    """
+    Resample the rows of a dirty sales frame up to n_rows with unique IDs
+    """
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(source), size=n_rows)
+    df = source.iloc[idx].reset_index(drop=True)
+    df['Transaction ID'] = 'TXN_' + pd.Series(np.arange(n_rows), dtype='int64').astype(str)
+    return df
+
+
+def time_cleaner(cleaner, df):
+    start = time.perf_counter()
+    result = cleaner(df.copy())
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cafe sales cleaner")
+    parser.add_argument('--input', default='dirty_cafe_sales.csv', help="Dirty CSV to resample rows from")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--legacy', action='store_true', help="Also time the old row-wise cleaner")
+    parser.add_argument('--legacy-max-rows', type=int, default=100_000,
+                        help="Largest size the row-wise cleaner is run on")
+    args = parser.parse_args()
+
+    source = pd.read_csv(args.input, dtype=str, keep_default_na=False, na_values=[''])
+
+    print(f"{'rows':>12} {'columnar s':>12} {'rows/sec':>14} {'legacy s':>10} {'rows/sec':>12} {'speedup':>8}")
+    for n_rows in args.sizes:
+        df = make_dirty_frame(source, n_rows)
+        result, elapsed = time_cleaner(clean_sales_data, df)
+        line = f"{n_rows:>12,} {elapsed:>12.3f} {n_rows / elapsed:>14,.0f}"
+
+        if args.legacy and n_rows <= args.legacy_max_rows:
+            expected, legacy_elapsed = time_cleaner(legacy_clean_sales_data, df)
+            pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+            line += f" {legacy_elapsed:>10.3f} {n_rows / legacy_elapsed:>12,.0f} {legacy_elapsed / elapsed:>7.0f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
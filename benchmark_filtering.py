@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of the dashboard filter.
+
+Compares the original boolean-mask filter (.dt.date comparisons plus isin
+on Item and Location over every row) with IndexedSales, which binary
+searches the sorted dates and looks category codes up in a small table.
+Both must select the same rows.
+
+    python benchmark_filtering.py --sizes 1000000 10000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from sales_index import IndexedSales
+from sales_storage import find_dataset, load_sales
+
+# (start, end, items, locations) as picked in the dashboard sidebar
+SCENARIOS = [
+    ('full year, all', '2023-01-01', '2023-12-31', None, None),
+    ('one quarter, 2 items', '2023-04-01', '2023-06-30', ['Coffee', 'Tea'], None),
+    ('one week, takeaway', '2023-08-07', '2023-08-13', None, ['Takeaway']),
+]
+
+
+def make_frame(source, n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), size=n_rows)].reset_index(drop=True)
+    df['Transaction ID'] = 'TXN_' + pd.Series(np.arange(n_rows), dtype='int64').astype(str)
+    return df
+
+
+def mask_filter(df, start, end, items, locations):
+    """
+    The filter as originally written in dashboard.py
+    """
+    items = items or df['Item'].unique().tolist()
+    locations = locations or df['Location'].unique().tolist()
+    return df[
+        (df['Transaction Date'].dt.date >= pd.Timestamp(start).date()) &
+        (df['Transaction Date'].dt.date <= pd.Timestamp(end).date()) &
+        (df['Item'].isin(items)) &
+        (df['Location'].isin(locations))
+    ]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard filtering")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    source = load_sales(find_dataset('analyzed_cafe_sales.csv'))
+
+    print(f"{'rows':>12} {'scenario':>22} {'mask ms':>10} {'index ms':>10} {'speedup':>8}")
+    for n_rows in args.sizes:
+        df = make_frame(source, n_rows)
+        start = time.perf_counter()
+        index = IndexedSales(df)
+        print(f"{n_rows:>12,} {'(build index)':>22} {'':>10} {(time.perf_counter() - start) * 1000:>10.1f}")
+
+        for name, start_date, end_date, items, locations in SCENARIOS:
+            expected, mask_time = best_of(
+                lambda: mask_filter(df, start_date, end_date, items, locations), args.repeat)
+            result, index_time = best_of(
+                lambda: index.filter(start_date, end_date, {'Item': items, 'Location': locations}), args.repeat)
+            assert sorted(result['Transaction ID']) == sorted(expected['Transaction ID'])
+            print(f"{n_rows:>12,} {name:>22} {mask_time * 1000:>10.1f} {index_time * 1000:>10.1f} "
+                  f"{mask_time / index_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare CSV, Parquet and Feather for the cleaned sales dataset.
+
+Resamples cleaned_cafe_sales.csv up to each requested size, writes it in
+every format through sales_storage and reports file size, write time and
+the time load_sales needs to get a typed frame back.
+
+    python benchmark_storage.py --sizes 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from sales_storage import columnar_available, load_sales, save_sales
+
+
+def make_cleaned_frame(source, n_rows, seed=42):
+    """
+    Resample the rows of a cleaned sales frame up to n_rows with unique IDs
+    """
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), size=n_rows)].reset_index(drop=True)
+    df['Transaction ID'] = 'TXN_' + pd.Series(np.arange(n_rows), dtype='int64').astype(str)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage formats for cafe sales data")
+    parser.add_argument('--input', default='cleaned_cafe_sales.csv', help="Cleaned CSV to resample rows from")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    formats = ['csv'] + (['parquet', 'feather'] if columnar_available() else [])
+    source = pd.read_csv(args.input, parse_dates=['Transaction Date'])
+
+    print(f"{'rows':>12} {'format':>8} {'size MB':>9} {'write s':>9} {'load s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.sizes:
+            df = make_cleaned_frame(source, n_rows)
+            for fmt in formats:
+                path = os.path.join(tmp, f'sales_{n_rows}.{fmt}')
+
+                start = time.perf_counter()
+                save_sales(df, path)
+                write_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                load_sales(path)
+                load_time = time.perf_counter() - start
+
+                size_mb = os.path.getsize(path) / 1e6
+                print(f"{n_rows:>12,} {fmt:>8} {size_mb:>9.1f} {write_time:>9.3f} {load_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
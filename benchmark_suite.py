@@ -0,0 +1,229 @@
+"""
+End-to-end benchmark of the pipeline on synthetic data.
+
+For each size, dirty data is generated with generate_dirty_sales.py (once;
+files are kept in benchmark_data/ and reused) and then every stage runs
+in a fresh process, so its peak RSS is not inflated by earlier stages:
+
+    clean    clean_csv_in_chunks, dirty CSV -> cleaned CSV/Parquet
+    analyze  run_pipeline without charts, cleaned -> reports + analyzed data
+    filter   IndexedSales build plus the dashboard filter scenarios
+    export   CSV export of every analyzed row, as the dashboard download does
+
+Results go to benchmark_results/<timestamp>.json together with the git
+commit and library versions, and are compared with the latest comparable
+run (or the one given with --compare). Only results of the same size, stage,
+seed, format and chunk size are compared.
+
+    python benchmark_suite.py --sizes 1000000 10000000
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import generate_dirty_sales
+from profiling import peak_rss_mb
+from sales_storage import path_for_format
+
+DATA_DIR = 'benchmark_data'
+RESULTS_DIR = 'benchmark_results'
+STAGES = ['clean', 'analyze', 'filter', 'export']
+
+
+def bench_clean(dirty_path, cleaned_path, chunksize):
+    from clean_cafe_sales import clean_csv_in_chunks
+    rows_in, rows_out, _ = clean_csv_in_chunks(dirty_path, cleaned_path, chunksize)
+    return {'rows_in': rows_in, 'rows_out': rows_out}
+
+
+def bench_analyze(cleaned_path, output_dir, analyzed_path):
+    from analyze_cafe_sales import run_pipeline
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_pipeline(cleaned_path, output_dir, charts=[], analyzed_path=analyzed_path)
+    return {}
+
+
+def bench_filter(analyzed_path):
+    from benchmark_filtering import SCENARIOS
+    from sales_index import IndexedSales
+    from sales_schema import memory_mb
+    from sales_storage import load_sales
+
+    df = load_sales(analyzed_path, compact=True)
+    start = time.perf_counter()
+    index = IndexedSales(df)
+    metrics = {'rows_in': len(df), 'frame_mb': memory_mb(df), 'index_build_s': time.perf_counter() - start}
+    for name, start_date, end_date, items, locations in SCENARIOS:
+        start = time.perf_counter()
+        index.filter(start_date, end_date, {'Item': items, 'Location': locations})
+        metrics[f'{name}_s'] = time.perf_counter() - start
+    return metrics
+
+
+def bench_export(analyzed_path):
+    from sales_index import IndexedSales
+    from sales_schema import expand_compact_columns
+    from sales_storage import load_sales
+
+    index = IndexedSales(load_sales(analyzed_path, compact=True), expand=expand_compact_columns)
+    with index.csv_file(np.arange(len(index))) as out:
+        size = out.seek(0, os.SEEK_END)
+    return {'rows_in': len(index), 'csv_mb': size / 2 ** 20}
+
+
+def _measure(func, args):
+    """
+    Run one stage in the current (fresh) process and time it
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    metrics = func(*args)
+    if not isinstance(metrics, dict):
+        metrics = {}
+    return {'wall_s': time.perf_counter() - wall, 'cpu_s': time.process_time() - cpu,
+            'peak_rss_mb': peak_rss_mb(), **metrics}
+
+
+def run_isolated(func, *args):
+    # spawn rather than fork, so the child does not start with a copy of the parent's heap
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_measure, func, args).result()
+
+
+def dirty_data(n_rows, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'dirty_{n_rows}_seed{seed}.csv')
+    if not os.path.exists(path):
+        print(f"🏭 Generating {n_rows:,} dirty rows...")
+        tmp_path = path + '.tmp'
+        # In a child too, so the parent (whose peak RSS the stage processes start from) stays small
+        run_isolated(generate_dirty_sales.generate, tmp_path, n_rows, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def benchmark_size(n_rows, seed, fmt, chunksize, stages):
+    dirty_path = dirty_data(n_rows, seed)
+    work_dir = os.path.join(DATA_DIR, f'work_{n_rows}_seed{seed}')
+    cleaned_path = path_for_format(os.path.join(work_dir, 'cleaned_cafe_sales.csv'), fmt)
+    analyzed_path = path_for_format(os.path.join(work_dir, 'analyzed_cafe_sales.csv'), fmt)
+    os.makedirs(work_dir, exist_ok=True)
+
+    jobs = {
+        'clean': (bench_clean, dirty_path, cleaned_path, chunksize),
+        'analyze': (bench_analyze, cleaned_path, os.path.join(work_dir, 'analysis_results'), analyzed_path),
+        'filter': (bench_filter, analyzed_path),
+        'export': (bench_export, analyzed_path),
+    }
+    results = []
+    for name in stages:
+        func, *args = jobs[name]
+        result = {'rows': n_rows, 'stage': name, 'seed': seed, 'format': fmt, 'chunksize': chunksize,
+                  **run_isolated(func, *args)}
+        print(f"{n_rows:>12,} {name:>8} {result['wall_s']:>9.2f}s {result['cpu_s']:>9.2f}s "
+              f"{result['peak_rss_mb'] or 0:>9.0f} MB")
+        results.append(result)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(results, exclude=None):
+    """
+    The latest results file with a run comparable to one of results, or None
+    """
+    keys = {result_key(result) for result in results}
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')), reverse=True):
+        if path == exclude:
+            continue
+        with open(path) as f:
+            run = json.load(f)
+        if any(result_key(result, run) in keys for result in run['results']):
+            return path
+    return None
+
+
+def result_key(result, run=None):
+    """
+    What makes two results comparable: the same size, stage, data seed, format and chunk size
+    """
+    # Older result files only kept the format and seed for the whole run, and no chunk size
+    run = run or {}
+    return (result['rows'], result['stage'], result.get('seed', run.get('seed')),
+            result.get('format', run.get('format')), result.get('chunksize', run.get('chunksize')))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        run = json.load(f)
+    baseline = {result_key(r, run): r for r in run['results']}
+    matched = [(result, baseline[result_key(result)]) for result in results if result_key(result) in baseline]
+    if not matched:
+        print(f"\n⚠️  {baseline_path} has no results with the same sizes, stages, seed, format and chunk size; "
+              "pass --compare to pick a comparable run")
+        return
+    print(f"\n📊 Compared with {baseline_path} (ratio < 1 means faster / smaller now)")
+    if len(matched) < len(results):
+        print(f"   {len(results) - len(matched)} results have no comparable baseline and are left out")
+    print(f"{'rows':>12} {'stage':>8} {'wall':>8} {'peak RSS':>9}")
+    for result, before in matched:
+        rss = (result['peak_rss_mb'] / before['peak_rss_mb']) if result['peak_rss_mb'] and before['peak_rss_mb'] else float('nan')
+        print(f"{result['rows']:>12,} {result['stage']:>8} {result['wall_s'] / before['wall_s']:>7.2f}x {rss:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cafe sales pipeline on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000], help="Dirty rows per run")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'feather'],
+                        help="Format of the cleaned and analyzed data")
+    parser.add_argument('--chunksize', type=int, default=500_000, help="Chunk size of the clean stage")
+    parser.add_argument('--compare', help="Results file to compare with (default: the previous run)")
+    args = parser.parse_args()
+
+    started = time.strftime('%Y%m%d-%H%M%S')
+    print(f"{'rows':>12} {'stage':>8} {'wall':>10} {'cpu':>10} {'peak RSS':>12}")
+    results = []
+    for n_rows in args.sizes:
+        results += benchmark_size(n_rows, args.seed, args.format, args.chunksize, args.stages)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f'{started}.json')
+    with open(path, 'w') as f:
+        json.dump({
+            'started': started,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'format': args.format,
+            'chunksize': args.chunksize,
+            'results': results,
+        }, f, indent=2)
+    print(f"\n💾 Results saved to {path}")
+
+    baseline = args.compare or previous_results(results, exclude=path)
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,289 @@
+import argparse
+import os
+import sqlite3
 import pandas as pd
 import numpy as np
-from datetime import datetime
-
-# Load the data
-df = pd.read_csv('dirty_cafe_sales.csv')
-
-# 1. Replace placeholder values with NaN
-placeholders = ['ERROR', 'UNKNOWN', '']
-df = df.replace(placeholders, np.nan)
-
-# 2. Clean Item column
-valid_items = ['Coffee', 'Tea', 'Cake', 'Cookie', 'Sandwich', 'Salad', 'Smoothie', 'Juice']
-df['Item'] = df['Item'].where(df['Item'].isin(valid_items), other=np.nan)
-
-# 3. Clean numeric columns
-df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-df['Price Per Unit'] = pd.to_numeric(df['Price Per Unit'], errors='coerce')
-
-def clean_currency(x):
-    if pd.isna(x):
-        return np.nan
-    try:
-        return float(x)
-    except:
-        return np.nan
-
-df['Total Spent'] = df['Total Spent'].apply(clean_currency)
-
-# 4. Recalculate Total Spent where possible
-def calculate_total_spent(row):
-    if pd.notna(row['Quantity']) and pd.notna(row['Price Per Unit']):
-        calculated = row['Quantity'] * row['Price Per Unit']
-        if pd.isna(row['Total Spent']) or (row['Total Spent'] != calculated):
-            return calculated
-    return row['Total Spent']
-
-df['Total Spent'] = df.apply(calculate_total_spent, axis=1)
-
-# 5. Clean Payment Method
-valid_payments = ['Credit Card', 'Cash', 'Digital Wallet']
-df['Payment Method'] = df['Payment Method'].where(df['Payment Method'].isin(valid_payments), other=np.nan)
-
-# 6. Clean Location
-df['Location'] = df['Location'].where(df['Location'].isin(['In-store', 'Takeaway']), other=np.nan)
-
-# 7. Clean Transaction Date
-def clean_date(date_str):
-    if pd.isna(date_str):
-        return np.nan
-    try:
-        # Try to parse the date in YYYY-MM-DD format
-        return pd.to_datetime(date_str, format='%Y-%m-%d')
-    except:
-        return np.nan
-
-df['Transaction Date'] = df['Transaction Date'].apply(clean_date)
-
-# 8. Remove rows where essential information is missing
-essential_columns = ['Item', 'Quantity', 'Price Per Unit', 'Total Spent']
-df = df.dropna(subset=essential_columns, how='all')
-
-# 9. Ensure Transaction ID is unique and not missing
-df = df.drop_duplicates('Transaction ID')
-df = df[df['Transaction ID'].notna()]
-
-# 10. Convert data types
-df['Transaction ID'] = df['Transaction ID'].astype(str)
-
-# Save the cleaned data
-df.to_csv('cleaned_cafe_sales.csv', index=False)
-print("Data cleaning complete. Cleaned data saved as 'cleaned_cafe_sales.csv'")
-
-# Print summary of cleaning
-print("\nCleaning Summary:")
-print(f"Original number of rows: {len(pd.read_csv('dirty_cafe_sales.csv'))}")
-print(f"Number of rows after cleaning: {len(df)}")
-print(f"Number of rows removed: {len(pd.read_csv('dirty_cafe_sales.csv')) - len(df)}")
-print("\nSample of cleaned data:")
-print(df.head())
+
+from sales_schema import VALID_ITEMS, VALID_PAYMENTS, VALID_LOCATIONS, transaction_id_numbers
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling
+from sales_storage import FORMATS, SalesWriter, iter_sales, path_for_format, save_sales
+from transaction_store import TransactionStore
+
+# Values the POS export writes when a field is missing or corrupted
+PLACEHOLDERS = ['ERROR', 'UNKNOWN', '']
+
+ESSENTIAL_COLUMNS = ['Item', 'Quantity', 'Price Per Unit', 'Total Spent']
+DATE_FORMAT = '%Y-%m-%d'
+# Sales exported with their time of day: the date, 'T' or a space, then hh:mm[:ss[.fff]]
+TIMESTAMP_PATTERN = r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?'
+DEFAULT_CHUNKSIZE = 500_000
+# Version of the cleaning rules: bump whenever clean_sales_data changes what it
+# keeps or how it fills values, so results cached under older rules are rebuilt
+# (2: timestamped Transaction Dates are kept)
+CLEANING_VERSION = 2
+
+
+def clean_sales_data(df):
+    """
+    Clean a raw cafe sales DataFrame.
+
+    Every step works on whole columns at once, so the cost grows with the
+    number of columns rather than with a Python call per row or per cell.
+    """
+    rows = len(df)
+
+    # 1. Replace placeholder values with NaN
+    with stage('placeholder replacement', rows, rows):
+        df = df.replace(PLACEHOLDERS, np.nan)
+
+    # 2. Clean Item column
+    with stage('item validation', rows, rows):
+        df['Item'] = df['Item'].where(df['Item'].isin(VALID_ITEMS), other=np.nan)
+
+    # 3. Clean numeric columns
+    # (always float64, so every chunk of a streamed file is written the same way)
+    with stage('numeric coercion', rows, rows):
+        df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').astype('float64')
+        df['Price Per Unit'] = pd.to_numeric(df['Price Per Unit'], errors='coerce').astype('float64')
+        df['Total Spent'] = pd.to_numeric(df['Total Spent'], errors='coerce').astype('float64')
+
+    # 4. Recalculate Total Spent wherever both Quantity and Price Per Unit are known
+    with stage('total spent reconciliation', rows, rows):
+        quantity = df['Quantity']
+        price = df['Price Per Unit']
+        known = quantity.notna() & price.notna()
+        df['Total Spent'] = df['Total Spent'].mask(known, quantity * price)
+
+    # 5-6. Clean Payment Method and Location
+    with stage('payment and location validation', rows, rows):
+        df['Payment Method'] = df['Payment Method'].where(df['Payment Method'].isin(VALID_PAYMENTS), other=np.nan)
+        df['Location'] = df['Location'].where(df['Location'].isin(VALID_LOCATIONS), other=np.nan)
+
+    # 7. Clean Transaction Date (anything but YYYY-MM-DD, with or without a time of day, becomes NaT)
+    with stage('date parsing', rows, rows):
+        df['Transaction Date'] = parse_transaction_dates(df['Transaction Date'])
+
+    # 8. Remove rows where essential information is missing
+    # 9. Ensure Transaction ID is unique and not missing
+    with stage('row filtering', rows) as filtering:
+        df = df.dropna(subset=ESSENTIAL_COLUMNS, how='all')
+        df = df.drop_duplicates('Transaction ID')
+        df = df[df['Transaction ID'].notna()]
+        filtering.rows_out = len(df)
+
+    # 10. Convert data types
+    df['Transaction ID'] = df['Transaction ID'].astype(str)
+
+    return df
+
+
+def parse_transaction_dates(values):
+    """
+    Parse YYYY-MM-DD dates and ISO timestamps (YYYY-MM-DD hh:mm[:ss]) into datetime64; anything else becomes NaT.
+
+    Plain dates are parsed first with their exact format; only the values
+    left over are matched against the timestamp pattern, so date-only data
+    costs a single vectorized pass.
+    """
+    dates = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    rest = np.flatnonzero(dates.isna().to_numpy() & values.notna().to_numpy())
+    if len(rest):
+        text = values.iloc[rest].astype(str)
+        timestamps = text.str.fullmatch(TIMESTAMP_PATTERN).to_numpy()
+        if timestamps.any():
+            parsed = pd.to_datetime(text[timestamps], format='ISO8601', errors='coerce')
+            dates.iloc[rest[timestamps]] = parsed.to_numpy()
+    return dates
+
+
+class SeenTransactionIds:
+    """
+    Compact in-memory set of the Transaction IDs written so far.
+
+    IDs of the usual TXN_<number> form are kept as int64 values in a few
+    sorted runs (8 bytes per ID); a new run is merged into the previous one
+    whenever it grows at least as large, so lookups stay logarithmic and
+    merges stay cheap. Any other ID falls back to a plain Python set.
+    """
+
+    def __init__(self):
+        self._runs = []
+        self._other = set()
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs) + len(self._other)
+
+    def _contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, keys).clip(max=len(run) - 1)
+            found |= run[pos] == keys
+        return found
+
+    def _add(self, keys):
+        run = np.sort(keys)
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = np.union1d(self._runs.pop(), run)
+        self._runs.append(run)
+
+    def add_new(self, ids):
+        """
+        Register a batch of unique IDs and return a mask of the ones not seen before
+        """
+        ids = pd.Series(ids, dtype=object).reset_index(drop=True)
+        numeric, keys = transaction_id_numbers(ids)
+        is_new = np.zeros(len(ids), dtype=bool)
+
+        new_keys = ~self._contains(keys)
+        is_new[numeric] = new_keys
+        if new_keys.any():
+            self._add(keys[new_keys])
+
+        for pos in np.flatnonzero(~numeric):
+            if ids[pos] not in self._other:
+                self._other.add(ids[pos])
+                is_new[pos] = True
+        return is_new
+
+
+class SqliteTransactionIds:
+    """
+    On-disk Transaction ID index for inputs whose IDs do not fit in memory
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS seen_ids (id TEXT PRIMARY KEY) WITHOUT ROWID')
+        self._conn.execute('CREATE TEMP TABLE batch_ids (id TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM seen_ids').fetchone()[0]
+
+    def add_new(self, ids):
+        """
+        Register a batch of unique IDs and return a mask of the ones not seen before
+        """
+        ids = pd.Series(ids, dtype=object).reset_index(drop=True)
+        with self._conn:
+            self._conn.execute('DELETE FROM batch_ids')
+            self._conn.executemany('INSERT INTO batch_ids VALUES (?)', ((i,) for i in ids))
+            existing = {row[0] for row in self._conn.execute(
+                'SELECT id FROM batch_ids JOIN seen_ids USING (id)')}
+            self._conn.execute('INSERT OR IGNORE INTO seen_ids SELECT id FROM batch_ids')
+        return ~ids.isin(existing).to_numpy()
+
+    def close(self):
+        self._conn.close()
+
+
+def clean_csv_in_chunks(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, seen_ids=None, append=False,
+                        store=None):
+    """
+    Clean a raw sales CSV chunk by chunk, appending each cleaned chunk to output_path
+    (CSV, Parquet or Feather, picked from its extension).
+
+    Only one chunk is held in memory at a time; Transaction IDs are
+    de-duplicated across chunks through seen_ids (a SeenTransactionIds by
+    default). With append=True the IDs already in output_path (if it
+    exists) are loaded first and new rows are added after them.
+
+    Returns (rows read, rows written, first cleaned chunk).
+    """
+    if seen_ids is None:
+        seen_ids = SeenTransactionIds()
+
+    writer = SalesWriter(output_path, append=append)
+    if append and os.path.exists(writer.path):
+        for existing in iter_sales(writer.path, chunksize):
+            seen_ids.add_new(existing['Transaction ID'])
+
+    rows_in = 0
+    rows_out = 0
+    first_chunk = None
+    for chunk in pd.read_csv(input_path, chunksize=chunksize):
+        rows_in += len(chunk)
+        with stage('clean', len(chunk)) as cleaning:
+            cleaned = clean_sales_data(chunk)
+            cleaning.rows_out = len(cleaned)
+        with stage('deduplicate ids', len(cleaned)) as deduplicating:
+            cleaned = cleaned[seen_ids.add_new(cleaned['Transaction ID'])]
+            deduplicating.rows_out = len(cleaned)
+
+        with stage('write', len(cleaned), len(cleaned)):
+            writer.write(cleaned)
+        if store is not None:
+            with stage('store insert', len(cleaned), len(cleaned)):
+                store.insert(cleaned)
+        rows_out += len(cleaned)
+        if first_chunk is None:
+            first_chunk = cleaned
+    writer.close()
+
+    return rows_in, rows_out, first_chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean raw cafe sales data")
+    parser.add_argument('--input', default='dirty_cafe_sales.csv', help="Raw sales CSV to clean")
+    parser.add_argument('--output', default='cleaned_cafe_sales.csv', help="Where to write the cleaned CSV")
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                        help="Output format (default: taken from the --output extension); "
+                             "parquet and feather need pyarrow")
+    parser.add_argument('--chunksize', type=int,
+                        help="Stream the input in chunks of this many rows instead of loading it at once")
+    parser.add_argument('--id-index',
+                        help="SQLite file used to de-duplicate Transaction IDs on disk (streaming mode only)")
+    parser.add_argument('--append', action='store_true',
+                        help="Append to an existing cleaned file, skipping IDs it already contains (streaming mode only)")
+    parser.add_argument('--db', help="Also load the cleaned rows into this SQLite transaction store")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.format:
+        args.output = path_for_format(args.output, args.format)
+    # Parquet and Feather files cannot be appended to, only started
+    if args.append and os.path.exists(args.output) and FORMATS.get(os.path.splitext(args.output)[1], 'csv') != 'csv':
+        parser.error("--append needs a CSV output")
+    start_profiling('clean', args.profile, args.cprofile)
+    store = TransactionStore(args.db) if args.db else None
+
+    if args.chunksize or args.id_index or args.append:
+        seen_ids = SqliteTransactionIds(args.id_index) if args.id_index else None
+        original_count, cleaned_count, df = clean_csv_in_chunks(
+            args.input, args.output, args.chunksize or DEFAULT_CHUNKSIZE, seen_ids, args.append, store)
+        if seen_ids is not None:
+            seen_ids.close()
+    else:
+        # Load the data
+        with stage('read csv') as reading:
+            raw = pd.read_csv(args.input)
+            reading.rows_out = original_count = len(raw)
+
+        with stage('clean', original_count) as cleaning:
+            df = clean_sales_data(raw)
+            cleaning.rows_out = cleaned_count = len(df)
+
+        # Save the cleaned data
+        with stage('write', cleaned_count, cleaned_count):
+            args.output = save_sales(df, args.output)
+        if store is not None:
+            with stage('store insert', cleaned_count, cleaned_count):
+                store.insert(df)
+    print(f"Data cleaning complete. Cleaned data saved as '{args.output}'")
+    if store is not None:
+        print(f"Transaction store '{args.db}' now holds {len(store):,} transactions")
+        store.close()
+
+    # Print summary of cleaning
+    print("\nCleaning Summary:")
+    print(f"Original number of rows: {original_count}")
+    print(f"Number of rows after cleaning: {cleaned_count}")
+    print(f"Number of rows removed: {original_count - cleaned_count}")
+    print("\nSample of cleaned data:")
+    print(df.head() if df is not None else "(no rows)")
+
+    for path in finish_profiling():
+        print(f"Profile written to '{path}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,19 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from functools import lru_cache
 import os
+from sales_storage import find_dataset, load_sales
+from sales_cube import DAY_ORDER, build_cube, hour_weekday_grid
+from sales_index import IndexedSales
+from sales_schema import expand_compact_columns
+from sales_sketch import Z_95, SalesSketch
+from transaction_store import StoreSales, open_store
+from profiling import PROFILE_ENV, StageProfiler
+from data_cache import SHARED_ENV, cached, file_fingerprint
+from report_writer import content_digest
+from live_ingest import LIVE_ENV, read_snapshot
+from forecasting import ALL, RevenueForecast
 
 # Set page config
 st.set_page_config(
@@ -13,27 +25,149 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load data
-@st.cache_data
-def load_data():
-    if os.path.exists('analyzed_cafe_sales.csv'):
-        df = pd.read_csv('analyzed_cafe_sales.csv', parse_dates=['Transaction Date'])
-        # Ensure Month is in datetime format for proper sorting
-        df['Month'] = pd.to_datetime(df['Month'])
-        return df
-    else:
-        st.error("Error: analyzed_cafe_sales.csv not found. Please run the analysis first.")
-        return None
-
-df = load_data()
-
-if df is not None:
+def build_dashboard_cube(cube):
+    cube['Month'] = cube['Transaction Date'].dt.to_period('M').dt.to_timestamp()
+    cube['DayOfWeek'] = cube['Transaction Date'].dt.day_name()
+    return cube
+
+def prepare_file_data(path):
+    """
+    The indexed transactions and cube of an analyzed sales file
+    """
+    # Compact types (int64 IDs, Int8 quantities, no stored Month/DayOfWeek)
+    # keep the resident frame several times smaller than the CSV's objects
+    df = load_sales(path, compact=True)
+
+    # Pre-aggregate once to day x hour x Item x Location x Payment Method so
+    # that every rerun only sums a few small cube slices
+    cube = build_dashboard_cube(build_cube(df))
+
+    # Distinct transaction counts can be summed across cube rows only if
+    # no Transaction ID appears in more than one row
+    ids_unique = df['Transaction ID'].is_unique
+
+    # Sketches and a sample for fast mode (the distinct-ID sketches are only
+    # needed when the cube's transaction counts cannot be summed)
+    sketch = SalesSketch(df, distinct=not ids_unique)
+
+    # Sort both by date and code their categories, so filters are a
+    # binary search plus integer lookups
+    # Pages and exports are expanded back to the analyzed columns as they are shown
+    return IndexedSales(df, expand=expand_compact_columns), IndexedSales(cube), ids_unique, sketch
+
+def data_source():
+    """
+    Where the data comes from ('store' or 'file', path) and the fingerprint of that file
+    """
+    # With CAFE_SALES_DB set, aggregate in SQLite and page raw rows from it,
+    # so the transactions never have to fit in memory
+    db_path = os.environ.get('CAFE_SALES_DB')
+    if db_path and os.path.exists(db_path):
+        return 'store', db_path, file_fingerprint(db_path)
+    # Parquet/Feather copies load with typed columns; CSV is the fallback
+    path = find_dataset('analyzed_cafe_sales.csv')
+    if path is not None:
+        return 'file', path, file_fingerprint(path)
+    return None, None, None
+
+# Load data (cached as a shared resource: the indexed arrays are read-only,
+# so reruns and sessions reuse them instead of unpickling a copy each time,
+# and they are mapped from one file in .data_cache/, so every server process
+# shares the same pages instead of holding a copy of its own).
+# The fingerprint is part of the key, so a regenerated file is picked up on
+# the next rerun (the analysis leaves a file with unchanged content alone, so
+# its fingerprint stays the same); the prepared file data is also kept on disk
+# by data_cache, so new processes map it instead of parsing the CSV again,
+# and its hash comes from the analysis manifest when it can.
+@st.cache_resource(max_entries=1)
+def load_data(kind, path, fingerprint):
+    if kind == 'store':
+        store = open_store(path)
+        cube = build_dashboard_cube(store.cube())
+        # Transaction IDs are the store's primary key, so they are unique
+        return StoreSales(store), IndexedSales(cube), True, None
+    if kind == 'file':
+        return cached(path, prepare_file_data, 'dashboard', digest=content_digest,
+                      shared=os.environ.get(SHARED_ENV) != '0')
+    st.error("Error: analyzed_cafe_sales.csv not found. Please run the analysis first.")
+    return None, None, None, None
+
+# Forecasts and anomaly scores of every Item/Location series, fitted on the
+# whole cube once per version of the data (a fraction of a second)
+@st.cache_resource(max_entries=1)
+def load_forecast(kind, path, fingerprint):
+    return RevenueForecast(load_data(kind, path, fingerprint)[1].frame)
+
+# Streamlit reads a download's whole file into server memory before sending
+# it, so larger selections are not offered as a single CSV
+DOWNLOAD_ROW_LIMIT = 1_000_000
+
+# Seconds between refreshes of the live panel
+LIVE_REFRESH_S = 2
+
+@st.cache_resource(max_entries=1)
+def load_live_snapshot(path, fingerprint):
+    return read_snapshot(path)
+
+# With CAFE_SALES_LIVE set to the snapshot of live_ingest.py, this panel
+# reruns on its own every few seconds (not the whole page) and only
+# unpickles the snapshot when its fingerprint changed
+@st.fragment(run_every=LIVE_REFRESH_S)
+def live_panel(path):
+    st.subheader("🔴 Live Sales")
+    snapshot = load_live_snapshot(path, file_fingerprint(path)) if os.path.exists(path) else None
+    if snapshot is None or snapshot['cube'] is None:
+        st.info(f"Waiting for live_ingest.py to publish sales to {path}...")
+        return
+
+    live_cube = snapshot['cube']
+    last_day = live_cube['Transaction Date'].max()
+    today = live_cube[live_cube['Transaction Date'] == last_day]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(f"Sales on {last_day:%Y-%m-%d}", f"${today['Total Spent'].sum():,.2f}")
+    with col2:
+        st.metric(f"Transactions on {last_day:%Y-%m-%d}", f"{int(today['Transaction Count'].sum()):,}")
+    with col3:
+        st.metric("Live Sales Total", f"${live_cube['Total Spent'].sum():,.2f}")
+    with col4:
+        st.metric("Rows Ingested", f"{snapshot['rows_in']:,}")
+    st.caption(f"{snapshot['rows_cleaned']:,} cleaned rows, last update {snapshot['updated']:%H:%M:%S}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        daily = live_cube.groupby('Transaction Date')['Total Spent'].sum().reset_index()
+        st.plotly_chart(px.line(daily, x='Transaction Date', y='Total Spent', title='Live Sales by Day',
+                                labels={'Total Spent': 'Total Sales ($)', 'Transaction Date': 'Date'}),
+                        use_container_width=True)
+    with col2:
+        by_item = today.groupby('Item', observed=True)['Total Spent'].sum().sort_values(ascending=False).reset_index()
+        st.plotly_chart(px.bar(by_item, x='Item', y='Total Spent', title=f'Sales by Item on {last_day:%Y-%m-%d}',
+                               labels={'Total Spent': 'Total Sales ($)', 'Item': 'Menu Item'}),
+                        use_container_width=True)
+
+# Per-rerun stage timings when CAFE_SALES_PROFILE is set (a profiler per
+# rerun, so concurrent sessions do not mix their records)
+profiler = StageProfiler('dashboard', os.environ.get(PROFILE_ENV))
+
+with profiler.stage('load data') as loading:
+    source = data_source()
+    sales, cube, ids_unique, sketch = load_data(*source)
+    loading.rows_out = len(sales) if sales is not None else 0
+
+# Page title
+st.title("☕ Cafe Sales Dashboard")
+
+if os.environ.get(LIVE_ENV):
+    live_panel(os.environ[LIVE_ENV])
+
+if sales is not None:
     # Sidebar filters
     st.sidebar.title("Filters")
     
     # Date range filter
-    min_date = df['Transaction Date'].min().date()
-    max_date = df['Transaction Date'].max().date()
+    min_date = cube.min_date.date()
+    max_date = cube.max_date.date()
     date_range = st.sidebar.date_input(
         "Date Range",
         value=(min_date, max_date),
@@ -42,65 +176,112 @@ if df is not None:
     )
     
     # Item filter
-    all_items = ['All'] + sorted(df['Item'].unique().tolist())
+    all_items = ['All'] + sorted(cube.values_present('Item'))
     selected_items = st.sidebar.multiselect('Select Items', all_items, default='All')
     if 'All' in selected_items or not selected_items:
         selected_items = all_items[1:]  # Exclude 'All' for filtering
     
     # Location filter
-    locations = ['All'] + df['Location'].unique().tolist()
+    locations = ['All'] + cube.values_present('Location')
     selected_locations = st.sidebar.multiselect('Select Locations', locations, default='All')
     if 'All' in selected_locations or not selected_locations:
         selected_locations = locations[1:]
     
-    # Apply filters
-    filtered_df = df[
-        (df['Transaction Date'].dt.date >= date_range[0]) & 
-        (df['Transaction Date'].dt.date <= date_range[1]) &
-        (df['Item'].isin(selected_items)) &
-        (df['Location'].isin(selected_locations))
-    ]
+    # Fast mode answers what needs the transactions themselves from load-time sketches
+    fast_mode = sketch is not None and st.sidebar.toggle(
+        "Fast mode (approximate)", value=False,
+        help="Estimate distinct transactions and sale percentiles from sketches and a sample, "
+             "with error bounds, instead of scanning the transactions")
+
+    # Apply filters to the cube (the end date stays the start date while a range is being picked)
+    start_date, end_date = date_range[0], date_range[-1]
+    filters = {'Item': selected_items, 'Location': selected_locations}
+    with profiler.stage('filter cube', len(cube)) as filtering:
+        filtered_cube = cube.filter(start_date, end_date, filters)
+        filtering.rows_out = len(filtered_cube)
+
+    # Only needed for exact distinct transactions when IDs repeat; sliced out
+    # at most once per rerun, however many of those answers need it
+    @lru_cache(maxsize=None)
+    def filter_raw_data():
+        return sales.filter(start_date, end_date, filters)
     
     # Calculate metrics
-    total_sales = filtered_df['Total Spent'].sum()
-    total_transactions = filtered_df['Transaction ID'].nunique()
-    avg_sale = filtered_df['Total Spent'].mean()
-    
-    # Page title
-    st.title("☕ Cafe Sales Dashboard")
+    with profiler.stage('kpis', len(filtered_cube), 1):
+        total_sales = filtered_cube['Total Spent'].sum()
+        transactions_error = None
+        if ids_unique:
+            total_transactions = filtered_cube['Transaction Count'].sum()
+        elif fast_mode:
+            total_transactions, relative_error = sketch.distinct_transactions(start_date, end_date, filters)
+            total_transactions = int(round(total_transactions))
+            transactions_error = Z_95 * relative_error
+        else:
+            total_transactions = filter_raw_data()['Transaction ID'].nunique()
+        avg_sale = total_sales / filtered_cube['Sales Count'].sum()
     
     # KPI Cards
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Sales", f"${total_sales:,.2f}")
     with col2:
-        st.metric("Total Transactions", f"{total_transactions:,}")
+        if transactions_error is None:
+            st.metric("Total Transactions", f"{total_transactions:,}")
+        else:
+            st.metric("Total Transactions", f"≈{total_transactions:,}",
+                      help=f"HyperLogLog estimate, ±{transactions_error:.1%} (95%)")
     with col3:
         st.metric("Average Sale", f"${avg_sale:,.2f}")
+    if fast_mode:
+        st.caption("Fast mode: ≈ values and percentiles are estimates (hover for 95% bounds); "
+                   "sales totals and charts come from the daily cube and stay exact.")
+
+    # Sale value percentiles: exact from the per-cell value counts, or estimated from the sample
+    if sketch is not None:
+        with profiler.stage('sale percentiles', rows_out=2):
+            if fast_mode:
+                percentiles = sketch.sale_quantiles(start_date, end_date, filters)
+            else:
+                percentiles = sketch.exact_sale_quantiles(start_date, end_date, filters)
+                percentiles = percentiles and [(value, value, value) for value in percentiles]
+        if percentiles is not None:
+            col1, col2 = st.columns(2)
+            for column, label, (value, low, high) in zip([col1, col2], ["Median Sale", "90th Percentile Sale"],
+                                                         percentiles):
+                with column:
+                    if fast_mode:
+                        st.metric(label, f"${value:,.2f}", help=f"Sample estimate, 95% CI ${low:,.2f} to ${high:,.2f}")
+                    else:
+                        st.metric(label, f"${value:,.2f}")
     
     # Sales Trend
     st.subheader("Sales Trend")
-    sales_trend = filtered_df.groupby('Month')['Total Spent'].sum().reset_index()
-    fig1 = px.line(sales_trend, x='Month', y='Total Spent', 
-                  title='Monthly Sales Trend',
-                  labels={'Total Spent': 'Total Sales ($)', 'Month': 'Month'})
-    st.plotly_chart(fig1, use_container_width=True)
+    with profiler.stage('chart sales trend', len(filtered_cube)) as charting:
+        sales_trend = filtered_cube.groupby('Month')['Total Spent'].sum().reset_index()
+        charting.rows_out = len(sales_trend)
+        fig1 = px.line(sales_trend, x='Month', y='Total Spent', 
+                      title='Monthly Sales Trend',
+                      labels={'Total Spent': 'Total Sales ($)', 'Month': 'Month'})
+        st.plotly_chart(fig1, use_container_width=True)
     
     # Sales by Category
     st.subheader("Sales by Category")
     col1, col2 = st.columns(2)
     
-    with col1:
+    with col1, profiler.stage('chart sales by item', len(filtered_cube)) as charting:
         # Sales by Item
-        sales_by_item = filtered_df.groupby('Item')['Total Spent'].sum().sort_values(ascending=False).reset_index()
+        sales_by_item = filtered_cube.groupby('Item', observed=True)['Total Spent'].sum().sort_values(ascending=False).reset_index()
+        charting.rows_out = len(sales_by_item)
         fig2 = px.bar(sales_by_item, x='Item', y='Total Spent',
                      title='Sales by Item',
                      labels={'Total Spent': 'Total Sales ($)', 'Item': 'Menu Item'})
         st.plotly_chart(fig2, use_container_width=True)
     
-    with col2:
+    with col2, profiler.stage('chart payment methods', len(filtered_cube)) as charting:
         # Payment Method Distribution
-        payment_dist = filtered_df['Payment Method'].value_counts().reset_index()
+        payment_dist = filtered_cube.groupby('Payment Method', observed=True)['Row Count'].sum()
+        payment_dist = payment_dist[payment_dist > 0].sort_values(ascending=False).reset_index()
+        charting.rows_out = len(payment_dist)
         payment_dist.columns = ['Payment Method', 'Count']
         fig3 = px.pie(payment_dist, values='Count', names='Payment Method',
                      title='Payment Method Distribution')
@@ -108,35 +289,133 @@ if df is not None:
     
     # Top Selling Items Table
     st.subheader("Top Selling Items")
-    top_items = filtered_df.groupby('Item').agg({
-        'Total Spent': 'sum',
-        'Quantity': 'sum',
-        'Transaction ID': 'nunique'
-    }).sort_values('Total Spent', ascending=False).reset_index()
-    
-    top_items.columns = ['Item', 'Total Sales ($)', 'Total Quantity', 'Number of Transactions']
-    st.dataframe(top_items, use_container_width=True)
+    with profiler.stage('top items table', len(filtered_cube)) as tabulating:
+        top_items = filtered_cube.groupby('Item', observed=True).agg({
+            'Total Spent': 'sum',
+            'Quantity': 'sum',
+            'Transaction Count': 'sum'
+        })
+        if not ids_unique and fast_mode:
+            top_items['Transaction Count'] = [
+                round(sketch.distinct_transactions(start_date, end_date, {**filters, 'Item': [item]})[0])
+                for item in top_items.index]
+        elif not ids_unique:
+            top_items['Transaction Count'] = filter_raw_data().groupby('Item', observed=True)['Transaction ID'].nunique()
+        top_items = top_items.sort_values('Total Spent', ascending=False).reset_index()
+        tabulating.rows_out = len(top_items)
+        
+        top_items.columns = ['Item', 'Total Sales ($)', 'Total Quantity', 'Number of Transactions']
+        st.dataframe(top_items, use_container_width=True)
     
     # Location Analysis
     st.subheader("Location Analysis")
-    location_sales = filtered_df.groupby('Location')['Total Spent'].sum().reset_index()
-    fig4 = px.bar(location_sales, x='Location', y='Total Spent',
-                 title='Sales by Location',
-                 color='Location')
-    st.plotly_chart(fig4, use_container_width=True)
+    with profiler.stage('chart location', len(filtered_cube)) as charting:
+        location_sales = filtered_cube.groupby('Location', observed=True)['Total Spent'].sum().reset_index()
+        charting.rows_out = len(location_sales)
+        fig4 = px.bar(location_sales, x='Location', y='Total Spent',
+                     title='Sales by Location',
+                     color='Location')
+        st.plotly_chart(fig4, use_container_width=True)
     
     # Day of Week Analysis
     st.subheader("Sales by Day of Week")
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    day_sales = filtered_df.groupby('DayOfWeek')['Total Spent'].sum().reindex(day_order).reset_index()
-    fig5 = px.line(day_sales, x='DayOfWeek', y='Total Spent',
-                  title='Sales by Day of Week',
-                  labels={'Total Spent': 'Total Sales ($)', 'DayOfWeek': 'Day of Week'})
-    st.plotly_chart(fig5, use_container_width=True)
-    
-    # Raw Data
+    with profiler.stage('chart day of week', len(filtered_cube), len(DAY_ORDER)):
+        day_sales = filtered_cube.groupby('DayOfWeek')['Total Spent'].sum().reindex(DAY_ORDER).reset_index()
+        fig5 = px.line(day_sales, x='DayOfWeek', y='Total Spent',
+                      title='Sales by Day of Week',
+                      labels={'Total Spent': 'Total Sales ($)', 'DayOfWeek': 'Day of Week'})
+        st.plotly_chart(fig5, use_container_width=True)
+    
+    # Day x Hour Heatmap, from the hour bins of the cube
+    st.subheader("Sales by Day and Hour")
+    with profiler.stage('chart day and hour', len(filtered_cube)) as charting:
+        day_hour = hour_weekday_grid(filtered_cube)
+        charting.rows_out = day_hour.size
+        if len(day_hour.columns):
+            fig6 = px.imshow(day_hour, aspect='auto', color_continuous_scale='YlGnBu',
+                             title='Sales by Day of Week and Hour of Day',
+                             labels={'x': 'Hour of Day', 'y': 'Day of Week', 'color': 'Total Sales ($)'})
+            st.plotly_chart(fig6, use_container_width=True)
+        if list(day_hour.columns) == [0]:
+            st.caption("These transactions only carry a date, so every sale falls in hour 0.")
+    
+    # Revenue Forecast: the series of the selected Item and/or Location when a single one is picked
+    st.subheader("Revenue Forecast & Anomalies")
+    with profiler.stage('forecast') as forecasting:
+        forecast = load_forecast(*source)
+        forecasting.rows_in = len(forecast)
+        item = selected_items[0] if len(selected_items) == 1 else ALL
+        location = selected_locations[0] if len(selected_locations) == 1 else ALL
+        level = {(False, False): 'Total', (True, False): 'Item',
+                 (False, True): 'Location', (True, True): 'Item x Location'}[item != ALL, location != ALL]
+        row = forecast.find(level, item, location)
+        forecasting.rows_out = 0 if row is None else len(forecast.days)
+    if row is not None:
+        history = forecast.history(row)
+        history = history[history['Date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        anomalous = history[history['Anomaly']]
+        fig7 = go.Figure([
+            go.Scatter(x=history['Date'], y=history['Revenue'], name='Revenue', mode='lines'),
+            go.Scatter(x=history['Date'], y=history['Expected'], name='Expected (weekday baseline)',
+                       mode='lines', line={'dash': 'dot'}),
+            go.Scatter(x=anomalous['Date'], y=anomalous['Revenue'], name='Anomaly', mode='markers',
+                       marker={'color': 'red', 'size': 9}),
+            go.Scatter(x=forecast.future, y=forecast.high[row], mode='lines', line={'width': 0},
+                       showlegend=False, hoverinfo='skip'),
+            go.Scatter(x=forecast.future, y=forecast.low[row], name='95% band', mode='lines', line={'width': 0},
+                       fill='tonexty', fillcolor='rgba(13, 110, 253, 0.15)'),
+            go.Scatter(x=forecast.future, y=forecast.forecast[row], name='Forecast', mode='lines'),
+        ])
+        name = ' / '.join(value for value in (item, location) if value != ALL) or 'All sales'
+        fig7.update_layout(title=f'Daily Revenue and {len(forecast.future)}-Day Forecast: {name}',
+                           xaxis_title='Date', yaxis_title='Revenue ($)')
+        st.plotly_chart(fig7, use_container_width=True)
+        st.caption("Pick a single item and/or location to see its own series. Anomalies are days more than "
+                   f"{forecast.threshold:g} standard deviations from their weekday baseline.")
+
+        anomalies = forecast.anomalies()
+        anomalies = anomalies[anomalies['Date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+                              & anomalies['Item'].isin(selected_items + [ALL])
+                              & anomalies['Location'].isin(selected_locations + [ALL])]
+        st.dataframe(anomalies.head(20), use_container_width=True, hide_index=True)
+    
+    # Raw Data: only the visible page is sliced out of the index (or queried from the store) and sent to the browser
     with st.expander("View Raw Data"):
-        st.dataframe(filtered_df, use_container_width=True)
+        col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+        with col1:
+            search = st.text_input("Search", placeholder="Transaction ID, item, payment method or location")
+        with col2:
+            sort_column = st.selectbox("Sort by", sales.columns, index=sales.columns.index('Transaction Date'))
+        with col3:
+            descending = st.checkbox("Descending")
+        with col4:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 500], index=1)
+
+        with profiler.stage('raw data selection') as selecting:
+            raw_positions = sales.positions(start_date, end_date, filters)
+            if search:
+                raw_positions = sales.search(raw_positions, search)
+            selecting.rows_out = len(raw_positions)
+        n_pages = max(1, -(-len(raw_positions) // page_size))
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
+
+        st.caption(f"{len(raw_positions):,} matching transactions, page {page} of {n_pages:,}")
+        with profiler.stage('raw data page', len(raw_positions)) as paging:
+            raw_page = sales.page(raw_positions, page - 1, page_size, sort_column, descending)
+            paging.rows_out = len(raw_page)
+            st.dataframe(raw_page, use_container_width=True, hide_index=True)
+        too_large = len(raw_positions) > DOWNLOAD_ROW_LIMIT
+        st.download_button(
+            "Download matching transactions (CSV)",
+            data=lambda: sales.csv_file(raw_positions),
+            file_name='filtered_cafe_sales.csv',
+            mime='text/csv',
+            disabled=too_large
+        )
+        if too_large:
+            st.caption(f"Downloads are limited to {DOWNLOAD_ROW_LIMIT:,} transactions, "
+                       "as the server holds the whole file in memory to send it. Narrow the filters, "
+                       "or export the data with powerbi_export.py.")
 
 # Add some styling
 st.markdown("""
@@ -163,3 +442,5 @@ st.markdown("""
     }
 </style>
 """, unsafe_allow_html=True)
+
+profiler.write_report()
@@ -0,0 +1,211 @@
+"""
+On-disk cache of data prepared from a source file, keyed on the file's fingerprint.
+
+cached(path, build, name) returns build(path), computing it only when the
+file changed since the last call, from any process: the result is pickled
+to .data_cache/ next to a small JSON record of the source's size, mtime
+and SHA-256. A matching size and mtime reuses the pickle without reading
+the source at all; otherwise the content hash decides, so a file rewritten
+with the same bytes (as every analysis run does) keeps its cache. Entries
+are replaced atomically, so Streamlit workers and sessions can share them.
+
+With shared=True an entry is written by dump_shared instead: the pickle
+keeps only the structure, and the data of every NumPy array (and so of
+every pandas column) follows it in the same file, aligned. load_shared
+maps that file read-only and rebuilds the arrays on top of the mapping,
+so all processes that load the entry share one copy in the OS page cache
+rather than each holding its own.
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = '.data_cache'
+# Bump when a cached structure changes shape (e.g. a class that is pickled)
+CACHE_VERSION = 4
+# Set to 0 to have the dashboard load private copies instead of shared mappings (for comparisons)
+SHARED_ENV = 'CAFE_SALES_SHARED'
+SHARED_MAGIC = b'CAFESHM1'
+# Offset alignment of the array data in a shared entry
+BUFFER_ALIGNMENT = 64
+
+
+def file_fingerprint(path):
+    """
+    (size, mtime in ns) of path: cheap to get, and changes whenever the file is rewritten
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_record(path):
+    """
+    A JSON record written by write_record, or None
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _replace(path, write):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_record(path, record):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, indent=2)
+    _replace(path, write)
+
+
+def _datetime_array(values, dtype):
+    return values.view(dtype)
+
+
+class _SharedPickler(pickle.Pickler):
+    # NumPy pickles datetime64/timedelta64 arrays in-band; as int64 views their data goes out of band too
+    def reducer_override(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype.kind in 'mM':
+            return _datetime_array, (obj.view('i8'), obj.dtype)
+        return NotImplemented
+
+
+def _aligned(offset):
+    return -(-offset // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+
+
+def dump_shared(obj, path):
+    """
+    Pickle obj to path with the data of its arrays stored after the pickle, for load_shared.
+
+    Layout: magic, pickle length, buffer count, (offset, length) of each
+    buffer, the pickle, then each buffer at an aligned offset.
+    """
+    stream = io.BytesIO()
+    buffers = []
+    _SharedPickler(stream, protocol=5, buffer_callback=buffers.append).dump(obj)
+    structure = stream.getvalue()
+    buffers = [buffer.raw() for buffer in buffers]
+
+    header_size = len(SHARED_MAGIC) + 16 + 16 * len(buffers)
+    offset = header_size + len(structure)
+    table = []
+    for buffer in buffers:
+        offset = _aligned(offset)
+        table.append((offset, buffer.nbytes))
+        offset += buffer.nbytes
+
+    with open(path, 'wb') as f:
+        f.write(SHARED_MAGIC + struct.pack('<QQ', len(structure), len(buffers)))
+        for entry in table:
+            f.write(struct.pack('<QQ', *entry))
+        f.write(structure)
+        for (start, _), buffer in zip(table, buffers):
+            f.write(b'\0' * (start - f.tell()))
+            f.write(buffer)
+
+
+def load_shared(path):
+    """
+    Load an object written by dump_shared, its arrays mapped read-only from the file rather than copied
+    """
+    with open(path, 'rb') as f:
+        # The mapping stays valid after the file is closed, as long as an array refers to it
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    magic_size = len(SHARED_MAGIC)
+    if bytes(view[:magic_size]) != SHARED_MAGIC:
+        raise pickle.UnpicklingError(f'{path} is not a shared cache entry')
+    structure_size, count = struct.unpack_from('<QQ', view, magic_size)
+    table = [struct.unpack_from('<QQ', view, magic_size + 16 + 16 * i) for i in range(count)]
+    start = magic_size + 16 + 16 * count
+    return pickle.loads(view[start:start + structure_size],
+                        buffers=[view[offset:offset + size] for offset, size in table])
+
+
+def unchanged_since(path, record, digest=file_digest):
+    """
+    Whether path still has the content described by record, and its current {'fingerprint', 'sha256'}.
+
+    record is such a dict saved earlier (or None). The file is only hashed,
+    with digest(path), when its size or mtime differ from the record's.
+    """
+    fingerprint = list(file_fingerprint(path))
+    if record is not None and record.get('fingerprint') == fingerprint:
+        return True, {'fingerprint': fingerprint, 'sha256': record['sha256']}
+    source = {'fingerprint': fingerprint, 'sha256': digest(path)}
+    return record is not None and record.get('sha256') == source['sha256'], source
+
+
+def cached(path, build, name, cache_dir=CACHE_DIR, digest=file_digest, shared=False):
+    """
+    build(path), or its cached result when path still has the content it was built from.
+
+    digest(path) gives the file's SHA-256 (e.g. report_writer.content_digest
+    to take it from a manifest). With shared=True the result is stored with
+    dump_shared and returned mapped by load_shared, in this process too.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    record_path = os.path.join(cache_dir, f'{name}-{key}.json')
+    version = [CACHE_VERSION, pd.__version__, 'shared' if shared else 'pickle']
+    load = load_shared if shared else _load_pickle
+
+    record = read_record(record_path)
+    if record is not None and (record.get('version') != version
+                               or not os.path.isfile(os.path.join(cache_dir, record.get('data', '')))):
+        record = None
+    # Hashed before building, so a file replaced mid-build is not recorded under the new content
+    usable, source = unchanged_since(path, record, digest)
+    if usable and source['fingerprint'] != record['fingerprint']:
+        # Same bytes under a new mtime: keep the entry, remember the new fingerprint
+        write_record(record_path, {**record, **source})
+    if usable:
+        try:
+            return load(os.path.join(cache_dir, record['data']))
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass  # written by an incompatible version of the code; rebuild it
+
+    result = build(path)
+    if shared:
+        # A file per content: processes still mapping the previous one keep it (Windows cannot replace it)
+        data_name = f'{name}-{key}-{source["sha256"][:16]}.shm'
+        _replace(os.path.join(cache_dir, data_name), lambda tmp_path: dump_shared(result, tmp_path))
+    else:
+        data_name = f'{name}-{key}.pkl'
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _replace(os.path.join(cache_dir, data_name), write)
+    previous = read_record(record_path)
+    write_record(record_path, {'version': version, 'source': os.path.abspath(path), 'data': data_name, **source})
+    if previous and previous.get('data') not in (None, data_name):
+        try:
+            os.remove(os.path.join(cache_dir, previous['data']))
+        except OSError:
+            pass  # still mapped on Windows, or already gone
+    # The built copy is dropped for the mapping every other process shares
+    return load(os.path.join(cache_dir, data_name)) if shared else result
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,298 @@
+"""
+Daily revenue forecasts and anomaly flags, fitted on the sales cube.
+
+Every series (all sales, each Item, each Location and each Item x Location)
+becomes one row of a series x days revenue matrix, summed from the cube
+with a single bincount, so the transactions are never read. All rows are
+then fitted at once with NumPy:
+
+    baseline    the mean revenue of the same weekday over the previous
+                SEASON_WEEKS weeks
+    anomalies   days whose residual from the baseline is more than
+                ANOMALY_Z standard deviations of the previous
+                RESIDUAL_WINDOW days' residuals (the deviation being at
+                least STD_FLOOR of the expected revenue, so a spike after
+                a flat history is still caught)
+    forecast    the weekday baseline of the last weeks for the next
+                HORIZON days, with a 95% band from the recent residuals
+
+Flagged days enter the baselines, residual windows and forecasts of the
+days after them capped at the edge of their band, so one spike does not
+skew them.
+
+Large sets of series are split into batches fitted by a pool of processes.
+
+    python forecasting.py                    # from the incremental analysis state, or the analyzed data
+    python forecasting.py --db cafe_sales.db
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from report_writer import ReportWriter
+from sales_storage import find_dataset, load_sales
+
+OUTPUT_DIR = 'analysis_results'
+# Series fitted for each level, by the cube columns that identify them
+FORECAST_LEVELS = {'Total': [], 'Item': ['Item'], 'Location': ['Location'], 'Item x Location': ['Item', 'Location']}
+SERIES_COLUMNS = ['Item', 'Location']
+ALL = 'All'
+SEASON = 7
+SEASON_WEEKS = 8
+RESIDUAL_WINDOW = 28
+# Residuals needed before a day can be flagged
+MIN_RESIDUALS = 14
+ANOMALY_Z = 3.0
+# Least standard deviation of the residuals: a share of the expected revenue, and never under $1
+STD_FLOOR = 0.1
+MIN_STD = 1.0
+HORIZON = 14
+# Normal quantile of a two-sided 95% interval
+Z_95 = 1.959964
+# Series per batch handed to a worker process
+BATCH_SERIES = 512
+
+
+def daily_series(cube, levels=FORECAST_LEVELS):
+    """
+    The daily revenue of every series of the cube.
+
+    Returns (series keys with Level, Item and Location columns, the days,
+    and a series x days float64 matrix with 0 on days without sales).
+    """
+    dates = cube['Transaction Date'].dt.normalize()
+    known = dates.notna().to_numpy()
+    for column in SERIES_COLUMNS:
+        known &= cube[column].notna().to_numpy()
+    cube, dates = cube[known], dates[known]
+    days = pd.date_range(dates.min(), dates.max(), freq='D') if len(cube) else pd.DatetimeIndex([])
+    day = ((dates - dates.min()) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64) if len(cube) else None
+    revenue = np.nan_to_num(cube['Total Spent'].to_numpy(dtype='float64'))
+
+    keys, matrices = [], []
+    for level, columns in levels.items():
+        if columns:
+            groups = cube.groupby(columns, observed=True, sort=True)
+            series = groups.ngroup().to_numpy()
+            level_keys = groups.size().reset_index()[columns]
+        else:
+            series = np.zeros(len(cube), dtype=np.int64)
+            level_keys = pd.DataFrame(index=range(1))
+        n_series = len(level_keys)
+        matrices.append(np.bincount(series * len(days) + day, weights=revenue,
+                                    minlength=n_series * len(days)).reshape(n_series, len(days))
+                        if len(cube) else np.zeros((n_series, 0)))
+        level_keys = level_keys.astype(object).reindex(columns=SERIES_COLUMNS, fill_value=ALL)
+        keys.append(level_keys.assign(Level=level)[['Level'] + SERIES_COLUMNS])
+    return pd.concat(keys, ignore_index=True), days, np.vstack(matrices)
+
+
+def fit_revenue(revenue, weeks=SEASON_WEEKS, window=RESIDUAL_WINDOW, horizon=HORIZON, threshold=ANOMALY_Z):
+    """
+    Fit a batch of series (rows of revenue); returns a dict of arrays:
+
+    baseline, z, anomaly (series x days) and forecast, low, high (series x horizon)
+
+    The days are fitted in order, and a day flagged as anomalous enters the
+    weekday means and residual windows of the days after it capped at the
+    edge of its band, so a single spike does not skew the baseline or the
+    band for weeks. (Leaving flagged days out altogether drags the baseline
+    of sparse series down to their empty days, flagging ever more of them.)
+    """
+    n_series, n_days = revenue.shape
+    baseline = np.full(revenue.shape, np.nan)
+    z = np.full(revenue.shape, np.nan)
+    anomaly = np.zeros(revenue.shape, dtype=bool)
+    # Revenue with the flagged days capped, and the residuals of the days with a baseline
+    capped = revenue.astype(float)
+    residual = np.zeros(revenue.shape)
+    usable = np.zeros(revenue.shape, dtype=bool)
+    count, total, squares = np.zeros(n_series), np.zeros(n_series), np.zeros(n_series)
+
+    for day in range(n_days):
+        # Slide the residual window to the `window` days before this one
+        if day:
+            for past, sign in ((day - 1, 1.0), (day - 1 - window, -1.0)):
+                if past >= 0:
+                    used = usable[:, past]
+                    count += sign * used
+                    total += sign * np.where(used, residual[:, past], 0.0)
+                    squares += sign * np.where(used, residual[:, past] ** 2, 0.0)
+        if day < SEASON:
+            continue
+
+        past = slice(max(day - SEASON * weeks, day % SEASON), day, SEASON)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            expected = capped[:, past].mean(axis=1)
+            mean = total / count
+            std = np.sqrt(np.maximum(squares - count * mean ** 2, 0.0) / (count - 1))
+            # A flat history has no spread at all, which would leave the next spike unflagged
+            std = np.maximum(std, np.maximum(STD_FLOOR * np.abs(expected), MIN_STD))
+            day_z = (revenue[:, day] - expected - mean) / std
+        day_z[(count < MIN_RESIDUALS) | np.isnan(expected)] = np.nan
+        baseline[:, day], z[:, day] = expected, day_z
+
+        anomaly[:, day] = np.abs(np.nan_to_num(day_z)) > threshold
+        band = expected + mean + np.sign(day_z) * threshold * std
+        capped[:, day] = np.where(anomaly[:, day], np.maximum(band, 0.0), revenue[:, day])
+        usable[:, day] = ~np.isnan(expected)
+        residual[:, day] = np.where(usable[:, day], capped[:, day] - expected, 0.0)
+
+    # Next days: the weekday means of the last weeks, and the spread of the last window of residuals,
+    # both with the flagged days capped
+    future = np.arange(n_days, n_days + horizon)
+    forecast = np.full((n_series, horizon), np.nan)
+    for phase in range(SEASON):
+        past = np.arange(phase, n_days, SEASON)[-weeks:]
+        if len(past):
+            forecast[:, future % SEASON == phase] = capped[:, past].mean(axis=1, keepdims=True)
+    recent, recent_valid = residual[:, -window:], usable[:, -window:]
+    n = recent_valid.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        recent_mean = recent.sum(axis=1, keepdims=True) / n
+        spread = Z_95 * np.sqrt(np.where(recent_valid, (recent - recent_mean) ** 2, 0.0).sum(axis=1, keepdims=True)
+                                / (n - 1))
+    return {
+        'baseline': baseline,
+        'z': z,
+        'anomaly': anomaly,
+        'forecast': forecast,
+        'low': np.maximum(forecast - spread, 0.0),
+        'high': forecast + spread,
+    }
+
+
+def _fit_batch(args):
+    return fit_revenue(*args)
+
+
+class RevenueForecast:
+    """
+    Baselines, anomaly scores and forecasts of every series of a cube
+    """
+
+    def __init__(self, cube, levels=FORECAST_LEVELS, weeks=SEASON_WEEKS, window=RESIDUAL_WINDOW,
+                 threshold=ANOMALY_Z, horizon=HORIZON, workers=1):
+        self.keys, self.days, self.revenue = daily_series(cube, levels)
+        self.threshold = threshold
+        self.future = pd.date_range(self.days[-1] + pd.Timedelta(days=1), periods=horizon, freq='D') \
+            if len(self.days) else pd.DatetimeIndex([])
+
+        batches = [(self.revenue[start:start + BATCH_SERIES], weeks, window, horizon, threshold)
+                   for start in range(0, len(self.revenue), BATCH_SERIES)]
+        workers = min(workers or os.cpu_count() or 1, len(batches))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                fits = list(pool.map(_fit_batch, batches))
+        else:
+            fits = [_fit_batch(batch) for batch in batches]
+        for name in ['baseline', 'z', 'anomaly', 'forecast', 'low', 'high']:
+            setattr(self, name, np.vstack([fit[name] for fit in fits]))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, level, item=ALL, location=ALL):
+        """
+        Row of the series of level for item and location, or None
+        """
+        match = (self.keys['Level'] == level) & (self.keys['Item'] == item) & (self.keys['Location'] == location)
+        rows = np.flatnonzero(match.to_numpy())
+        return int(rows[0]) if len(rows) else None
+
+    def history(self, row):
+        """
+        Revenue, baseline and anomaly score of one series, one row per day
+        """
+        return pd.DataFrame({
+            'Date': self.days,
+            'Revenue': self.revenue[row],
+            'Expected': self.baseline[row],
+            'Z': self.z[row],
+            'Anomaly': self.anomaly[row],
+        })
+
+    def forecasts(self):
+        """
+        The forecast of every series for the next days, with a 95% band
+        """
+        n_series, horizon = self.forecast.shape
+        return self.keys.loc[self.keys.index.repeat(horizon)].reset_index(drop=True).assign(
+            Date=np.tile(self.future, n_series),
+            Forecast=self.forecast.ravel(),
+            Low=self.low.ravel(),
+            High=self.high.ravel(),
+        )
+
+    def anomalies(self):
+        """
+        Every day of every series flagged as anomalous, the strongest first
+        """
+        rows, days = np.nonzero(self.anomaly)
+        flagged = self.keys.iloc[rows].reset_index(drop=True).assign(
+            Date=self.days[days],
+            Revenue=self.revenue[rows, days],
+            Expected=self.baseline[rows, days],
+            Z=self.z[rows, days],
+        )
+        return flagged.iloc[np.argsort(-np.abs(flagged['Z'].to_numpy()), kind='stable')].reset_index(drop=True)
+
+
+def load_cube(db=None, state=None, source=None):
+    """
+    The sales cube to fit: from a TransactionStore, a saved incremental analysis state, or an analyzed dataset
+    """
+    if db:
+        from transaction_store import TransactionStore
+        store = TransactionStore(db)
+        try:
+            return store.cube()
+        finally:
+            store.close()
+    if state:
+        from incremental_analysis import load_state
+        return load_state(state).cube
+    from sales_cube import build_cube
+    return build_cube(load_sales(source, compact=True))
+
+
+def main():
+    from incremental_analysis import STATE_FILE
+
+    parser = argparse.ArgumentParser(description="Forecast daily revenue and flag anomalous days per Item and Location")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--db', help="Fit the cube of this SQLite store")
+    source.add_argument('--state', help=f"Fit the cube of an incremental analysis state (default: {STATE_FILE} if present)")
+    source.add_argument('--input', help="Fit an analyzed dataset (default: freshest analyzed_cafe_sales.*)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--horizon', type=int, default=HORIZON, help="Days to forecast")
+    parser.add_argument('--threshold', type=float, default=ANOMALY_Z, help="|z| above which a day is anomalous")
+    parser.add_argument('--workers', type=int, help="Processes fitting batches of series (default: one per CPU)")
+    args = parser.parse_args()
+
+    state = args.state or (STATE_FILE if not (args.db or args.input) and os.path.exists(STATE_FILE) else None)
+    source = args.input or (None if args.db or state else find_dataset('analyzed_cafe_sales.csv'))
+    if not (args.db or state or source):
+        print("❌ Could not find analyzed data. Please run the analysis first.")
+        return
+
+    start = time.perf_counter()
+    cube = load_cube(args.db, state, source)
+    loaded = time.perf_counter()
+    model = RevenueForecast(cube, threshold=args.threshold, horizon=args.horizon, workers=args.workers)
+    fitted = time.perf_counter()
+    print(f"📈 Fitted {len(model):,} series over {len(model.days):,} days in {fitted - loaded:.2f}s "
+          f"(cube of {len(cube):,} rows from {args.db or state or source} loaded in {loaded - start:.2f}s)")
+
+    anomalies = model.anomalies()
+    with ReportWriter(args.output_dir) as writer:
+        writer.write_csv(os.path.join(args.output_dir, 'revenue_forecast.csv'), model.forecasts(), index=False)
+        writer.write_csv(os.path.join(args.output_dir, 'revenue_anomalies.csv'), anomalies, index=False)
+    print(f"✅ {args.horizon}-day forecasts and {len(anomalies):,} anomalous days written to '{args.output_dir}'")
+
+
+if __name__ == "__main__":
+    main()
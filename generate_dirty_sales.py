@@ -0,0 +1,150 @@
+"""
+Generate dirty cafe sales data of any size, reproducibly.
+
+The output has the columns and the kinds of damage of dirty_cafe_sales.csv:
+blank, ERROR and UNKNOWN placeholders in every column except the ID (at
+the rates measured on that file), dates in the wrong format, Total Spent
+values that do not match Quantity x Price Per Unit, and rows exported
+twice under the same Transaction ID. With --times every sale also gets a
+time of day within opening hours (YYYY-MM-DD hh:mm:ss). The same seed and size always give
+the same file: rows are generated in fixed blocks, each from its own
+seeded random stream, and written one block at a time so 100M rows need
+no more memory than a single block.
+
+    python generate_dirty_sales.py --rows 10000000 --output dirty_10m.csv --seed 7
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from sales_schema import VALID_ITEMS, VALID_PAYMENTS, VALID_LOCATIONS
+
+MENU_PRICES = {'Coffee': 2.0, 'Tea': 1.5, 'Cake': 3.0, 'Cookie': 1.0,
+               'Sandwich': 4.0, 'Salad': 5.0, 'Smoothie': 4.0, 'Juice': 3.0}
+
+# Share of blank / ERROR / UNKNOWN values per column, as in dirty_cafe_sales.csv
+PLACEHOLDER_RATES = {
+    'Item': (0.033, 0.029, 0.034),
+    'Quantity': (0.014, 0.017, 0.017),
+    'Price Per Unit': (0.018, 0.019, 0.016),
+    'Total Spent': (0.017, 0.016, 0.016),
+    'Payment Method': (0.258, 0.031, 0.029),
+    'Location': (0.326, 0.036, 0.034),
+    'Transaction Date': (0.016, 0.014, 0.016),
+}
+PLACEHOLDERS = ['', 'ERROR', 'UNKNOWN']
+
+# Rows per generated block; changing it changes the data a seed produces
+BLOCK_ROWS = 500_000
+# Opening hours of the generated sales with --times: 07:00 to 19:59
+OPENING_HOURS = (7, 20)
+# Multiplier of the ID permutation; odd and not a multiple of 5, so coprime with any power of ten
+ID_MULTIPLIER = 2_654_435_761
+
+
+def transaction_ids(positions, n_rows, seed):
+    """
+    Distinct TXN_ IDs for row positions, scattered like the real ones.
+
+    Position i maps to M + (a*i + b) mod M with M a power of ten above the
+    row count; a is coprime with M, so no two positions share an ID.
+    """
+    modulus = 10 ** max(7, len(str(n_rows)) + 1)
+    offset = seed * 7919 % modulus
+    numbers = modulus + (ID_MULTIPLIER * positions + offset) % modulus
+    return 'TXN_' + pd.Series(numbers, dtype='int64').astype(str)
+
+
+def generate_block(block, n_rows, seed, first_date, days, duplicate_rate, mismatch_rate, bad_date_rate,
+                   times=False):
+    """
+    Block number block of the dirty dataset as a string DataFrame
+    """
+    rng = np.random.default_rng([seed, block])
+    start = block * BLOCK_ROWS
+    size = min(BLOCK_ROWS, n_rows - start)
+
+    item_codes = rng.integers(0, len(VALID_ITEMS), size)
+    items = np.array(VALID_ITEMS)[item_codes]
+    prices = np.array([MENU_PRICES[item] for item in VALID_ITEMS])[item_codes]
+    quantity = rng.integers(1, 6, size)
+    total = quantity * prices
+
+    # Some totals were keyed in wrong
+    wrong = rng.random(size) < mismatch_rate
+    total[wrong] = total[wrong] + rng.integers(1, 5, wrong.sum())
+
+    dates = pd.Timestamp(first_date) + pd.to_timedelta(rng.integers(0, days, size), unit='D')
+    date_format = '%Y-%m-%d'
+    if times:
+        open_s, close_s = OPENING_HOURS[0] * 3600, OPENING_HOURS[1] * 3600
+        dates = dates + pd.to_timedelta(rng.integers(open_s, close_s, size), unit='s')
+        date_format = '%Y-%m-%d %H:%M:%S'
+    date_text = dates.strftime(date_format).to_numpy(dtype=object)
+    # ...and some dates were exported in a local format the cleaner rejects
+    misformatted = rng.random(size) < bad_date_rate
+    date_text[misformatted] = dates[misformatted].strftime('%d/%m/%Y')
+
+    df = pd.DataFrame({
+        'Transaction ID': transaction_ids(np.arange(start, start + size, dtype='int64'), n_rows, seed),
+        'Item': items,
+        'Quantity': quantity.astype(str),
+        'Price Per Unit': prices.astype(str),
+        'Total Spent': total.astype(str),
+        'Payment Method': np.array(VALID_PAYMENTS)[rng.integers(0, len(VALID_PAYMENTS), size)],
+        'Location': np.array(VALID_LOCATIONS)[rng.integers(0, len(VALID_LOCATIONS), size)],
+        'Transaction Date': date_text,
+    }).astype(object)
+
+    for column, rates in PLACEHOLDER_RATES.items():
+        draw = rng.random(size)
+        bounds = np.cumsum(rates)
+        for placeholder, low, high in zip(PLACEHOLDERS, np.r_[0, bounds[:-1]], bounds):
+            df.loc[(draw >= low) & (draw < high), column] = placeholder
+
+    # Rows exported twice: copy an earlier row of the block over a later one
+    duplicates = np.flatnonzero(rng.random(size) < duplicate_rate)
+    duplicates = duplicates[duplicates > 0]
+    if len(duplicates):
+        sources = (rng.random(len(duplicates)) * duplicates).astype('int64')
+        df.iloc[duplicates] = df.iloc[sources].to_numpy()
+    return df
+
+
+def generate(output_path, n_rows, seed=42, first_date='2023-01-01', days=365,
+             duplicate_rate=0.002, mismatch_rate=0.01, bad_date_rate=0.005, times=False):
+    """
+    Write n_rows of dirty sales data to output_path; returns the path
+    """
+    with open(output_path, 'w', newline='') as f:
+        for block in range(-(-n_rows // BLOCK_ROWS)):
+            rows = generate_block(block, n_rows, seed, first_date, days,
+                                  duplicate_rate, mismatch_rate, bad_date_rate, times)
+            rows.to_csv(f, index=False, header=block == 0)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate reproducible dirty cafe sales data")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Number of rows to generate")
+    parser.add_argument('--output', default='dirty_cafe_sales_synthetic.csv', help="Where to write the CSV")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed; the same seed gives the same file")
+    parser.add_argument('--first-date', default='2023-01-01', help="First transaction date")
+    parser.add_argument('--days', type=int, default=365, help="Number of days the transactions span")
+    parser.add_argument('--duplicate-rate', type=float, default=0.002, help="Share of rows repeating an earlier ID")
+    parser.add_argument('--mismatch-rate', type=float, default=0.01,
+                        help="Share of rows whose Total Spent is not Quantity x Price Per Unit")
+    parser.add_argument('--bad-date-rate', type=float, default=0.005, help="Share of dates in the wrong format")
+    parser.add_argument('--times', action='store_true', help="Give every sale a time of day within opening hours")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.output, args.rows, args.seed, args.first_date, args.days,
+             args.duplicate_rate, args.mismatch_rate, args.bad_date_rate, args.times)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Wrote {args.rows:,} rows to '{args.output}' in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
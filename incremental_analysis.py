@@ -0,0 +1,149 @@
+"""
+Incremental version of the analysis in analyze_cafe_sales.py.
+
+The aggregate state (a sales cube, the exact set of Transaction IDs and a
+high-water mark into the cleaned dataset) is kept in a pickle between
+runs. Each run reads only the rows appended to the cleaned data since the
+last run, folds them into the state and rewrites the analysis CSVs, which
+come out the same as a full recompute.
+
+    python clean_cafe_sales.py --input todays_sales.csv --append --chunksize 500000
+    python incremental_analysis.py
+"""
+import argparse
+import os
+import pickle
+import pandas as pd
+
+from analyze_cafe_sales import OUTPUT_DIR, compute_cube_reports, compute_key_insights, save_reports
+from clean_cafe_sales import SeenTransactionIds
+from sales_schema import apply_column_types
+from sales_storage import FORMATS, find_dataset, load_sales
+import sales_cube
+
+STATE_FILE = os.path.join('analysis_state', 'aggregate_state.pkl')
+# Bump when the saved aggregates change shape (e.g. the cube grain), so old states are rebuilt
+STATE_VERSION = 2
+
+
+class AnalysisState:
+    """
+    Running aggregates for the analysis, mergeable one batch of rows at a time
+    """
+
+    def __init__(self, source):
+        self.version = STATE_VERSION
+        self.source = source
+        self.cube = None
+        self.seen_ids = SeenTransactionIds()
+        # High-water mark: rows of the source consumed so far and the ID of the last one
+        self.rows_consumed = 0
+        self.last_id = None
+
+    def update(self, rows, ids_checked=False):
+        """
+        Fold a batch of new cleaned rows into the state.
+
+        ids_checked means the caller already dropped the IDs seen before,
+        through self.seen_ids (as live_ingest does before writing the rows out).
+        """
+        if len(rows):
+            self.last_id = rows['Transaction ID'].iloc[-1]
+        self.rows_consumed += len(rows)
+
+        # Same preparation as the full analysis
+        rows = rows.drop_duplicates().dropna()
+        if not ids_checked:
+            rows = rows[self.seen_ids.add_new(rows['Transaction ID'])]
+        if not len(rows):
+            return 0
+
+        self.cube = sales_cube.combine_cubes(self.cube, sales_cube.build_cube(rows))
+        return len(rows)
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_new_rows(path, state):
+    """
+    Return the rows of path past the state's high-water mark.
+
+    Returns None when the source no longer starts with the rows already
+    consumed (it was rewritten rather than appended to), in which case the
+    state has to be rebuilt.
+    """
+    # Re-read the last consumed row too, to check it is still the same transaction
+    offset = max(state.rows_consumed - 1, 0)
+    if FORMATS.get(os.path.splitext(path)[1], 'csv') == 'csv':
+        rows = apply_column_types(pd.read_csv(path, skiprows=range(1, offset + 1)))
+    else:
+        rows = load_sales(path).iloc[offset:]
+
+    if state.rows_consumed:
+        if not len(rows) or rows['Transaction ID'].iloc[0] != state.last_id:
+            return None
+        rows = rows.iloc[1:]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold newly cleaned cafe sales into the running analysis")
+    parser.add_argument('--source', help="Cleaned dataset (default: freshest cleaned_cafe_sales.*)")
+    parser.add_argument('--state', default=STATE_FILE, help="Where the aggregate state is kept")
+    parser.add_argument('--full', action='store_true', help="Discard the saved state and rebuild it")
+    args = parser.parse_args()
+
+    source = args.source or find_dataset('cleaned_cafe_sales.csv')
+    if source is None:
+        print("❌ Could not find cleaned data. Please run clean_cafe_sales.py first.")
+        return
+
+    state = None if args.full else load_state(args.state)
+    if state is not None and getattr(state, 'version', 1) != STATE_VERSION:
+        print("⚠️  Saved state was built by an older version, rebuilding it")
+        state = None
+    if state is not None and state.source != source:
+        print(f"⚠️  Saved state was built from {state.source}, rebuilding from {source}")
+        state = None
+
+    rows = None
+    if state is not None:
+        rows = read_new_rows(source, state)
+        if rows is None:
+            print(f"⚠️  {source} was rewritten since the last run, rebuilding the state")
+            state = None
+    if state is None:
+        state = AnalysisState(source)
+        rows = read_new_rows(source, state)
+
+    added = state.update(rows)
+    print(f"📥 {len(rows):,} new rows read, {added:,} added to the analysis "
+          f"({state.rows_consumed:,} rows consumed in total)")
+    if state.cube is None:
+        print("❌ No analyzable rows yet.")
+        return
+
+    reports = compute_cube_reports(state.cube)
+    save_reports(reports, compute_key_insights(reports, int(state.cube['Row Count'].sum())))
+    save_state(state, args.state)
+    print(f"✅ Analysis results updated in '{OUTPUT_DIR}', state saved to '{args.state}'")
+
+
+if __name__ == "__main__":
+    # Run from the importable module, so the pickled state refers to
+    # incremental_analysis.AnalysisState and other scripts can load it
+    import incremental_analysis
+    incremental_analysis.main()
@@ -0,0 +1,240 @@
+"""
+Live ingestion: tail new dirty sales and keep running aggregates for the dashboard.
+
+Watches an append-only CSV, or a directory of them, for new transactions.
+On every poll the complete lines appended since the last poll form a
+micro-batch, which is cleaned with the rules of clean_cafe_sales.py,
+de-duplicated against every Transaction ID seen so far and folded into a
+running sales cube (the AnalysisState of incremental_analysis.py). The
+cube is then published as an atomic snapshot that the dashboard polls,
+so new sales show up within seconds and the history is never read again.
+
+    python live_ingest.py --watch incoming/
+    CAFE_SALES_LIVE=live_state/snapshot.pkl streamlit run dashboard.py
+
+The read positions and running aggregates (every seen ID included) are
+saved as a checkpoint every --checkpoint seconds and on shutdown, rather
+than after each batch, so a poll does not cost a pickle of the whole
+history. The cleaned rows are appended to --cleaned-output at the same
+checkpoints, so that file never runs ahead of the saved state, and a
+restarted ingester carries on where the last checkpoint stopped.
+"""
+import argparse
+import glob
+import io
+import os
+import signal
+import time
+import pandas as pd
+
+from clean_cafe_sales import clean_sales_data
+from incremental_analysis import STATE_VERSION, AnalysisState, load_state, save_state
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling
+from sales_schema import apply_column_types
+from sales_storage import SalesWriter
+
+LIVE_DIR = 'live_state'
+STATE_FILE = os.path.join(LIVE_DIR, 'ingest_state.pkl')
+SNAPSHOT_FILE = os.path.join(LIVE_DIR, 'snapshot.pkl')
+# The dashboard shows the live panel when this names a snapshot
+LIVE_ENV = 'CAFE_SALES_LIVE'
+# Bump when the saved ingest state changes shape, so old states are started over
+INGEST_VERSION = 2
+# Seconds between saves of the ingest state
+CHECKPOINT_S = 30.0
+
+
+class TailedFile:
+    """
+    Read position in one append-only CSV file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.offset = 0
+
+    def read_new(self):
+        """
+        The complete lines appended since the last call as a raw DataFrame, or None
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # Truncated or replaced: read it again, the IDs already seen are skipped
+            self.header, self.offset = None, 0
+        if size == self.offset:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        # A line still being written is left for the next poll
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return None
+        data = data[:end]
+        self.offset += end
+        if self.header is None:
+            first = data.index(b'\n') + 1
+            self.header, data = data[:first], data[first:]
+        if not data:
+            return None
+        return pd.read_csv(io.BytesIO(self.header + data))
+
+
+class LiveIngest:
+    """
+    Tails the watched files and folds their new rows into a running cube
+    """
+
+    def __init__(self, watch):
+        self.version = INGEST_VERSION
+        self.watch = watch
+        self.files = {}
+        self.analysis = AnalysisState(watch)
+        # IDs already cleaned, as the cleaner's de-duplication across chunks; the
+        # running analysis keeps the same set, so the IDs are held only once
+        self.seen_ids = self.analysis.seen_ids
+        self.rows_in = 0
+        self.rows_cleaned = 0
+
+    def watched_files(self):
+        if os.path.isdir(self.watch):
+            return sorted(glob.glob(os.path.join(self.watch, '*.csv')))
+        return [self.watch] if os.path.exists(self.watch) else []
+
+    def poll(self, writer=None):
+        """
+        Ingest the rows appended to every watched file since the last poll; returns how many were read
+        """
+        rows_read = 0
+        for path in self.watched_files():
+            raw = self.files.setdefault(path, TailedFile(path)).read_new()
+            if raw is None:
+                continue
+            rows_read += len(raw)
+
+            with stage('clean', len(raw)) as cleaning:
+                cleaned = clean_sales_data(raw)
+                cleaned = cleaned[self.seen_ids.add_new(cleaned['Transaction ID'])]
+                cleaning.rows_out = len(cleaned)
+            if writer is not None:
+                with stage('write', len(cleaned), len(cleaned)):
+                    writer.write(cleaned)
+            with stage('fold into cube', len(cleaned)) as folding:
+                # Typed as the analysis loads the cleaned data, money kept in float64
+                self.analysis.update(apply_column_types(cleaned, money_dtype='float64'), ids_checked=True)
+                folding.rows_out = len(self.analysis.cube) if self.analysis.cube is not None else 0
+            self.rows_cleaned += len(cleaned)
+
+        self.rows_in += rows_read
+        return rows_read
+
+    def snapshot(self):
+        """
+        What the dashboard shows: the running cube and a few counters
+        """
+        return {
+            'cube': self.analysis.cube,
+            'rows_in': self.rows_in,
+            'rows_cleaned': self.rows_cleaned,
+            'updated': pd.Timestamp.now(),
+        }
+
+
+class PendingRows:
+    """
+    Cleaned rows held back until the next checkpoint, then written to writer
+    """
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        self.frames = []
+
+    def write(self, df):
+        if self.writer is not None:
+            self.frames.append(df)
+
+    def flush(self):
+        for df in self.frames:
+            self.writer.write(df)
+        self.frames = []
+
+
+def read_snapshot(path=SNAPSHOT_FILE):
+    """
+    The snapshot last published to path, or None
+    """
+    return load_state(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail new cafe sales and keep the live dashboard up to date")
+    parser.add_argument('--watch', required=True, help="Append-only CSV file, or a directory of CSV files")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls")
+    parser.add_argument('--state', default=STATE_FILE, help="Where read positions and aggregates are kept")
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE, help="Where the dashboard snapshot is published")
+    parser.add_argument('--cleaned-output', help="Also append the cleaned rows to this CSV")
+    parser.add_argument('--checkpoint', type=float, default=CHECKPOINT_S,
+                        help="Seconds between saves of the ingest state (it is also saved on shutdown)")
+    parser.add_argument('--reset', action='store_true', help="Discard the saved state and start from the beginning")
+    parser.add_argument('--once', action='store_true', help="Ingest what is there now and exit")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling('live_ingest', args.profile, args.cprofile)
+
+    ingest = None if args.reset else load_state(args.state)
+    if ingest is not None and (getattr(ingest, 'version', 1), getattr(ingest.analysis, 'version', 1)) \
+            != (INGEST_VERSION, STATE_VERSION):
+        print("⚠️  Saved state was built by an older version, starting over")
+        ingest = None
+    if ingest is not None and ingest.watch != args.watch:
+        print(f"⚠️  Saved state was built from {ingest.watch}, starting over for {args.watch}")
+        ingest = None
+    ingest = ingest or LiveIngest(args.watch)
+
+    writer = None
+    if args.cleaned_output:
+        writer = SalesWriter(args.cleaned_output, append=os.path.exists(args.cleaned_output))
+    pending = PendingRows(writer)
+
+    def checkpoint():
+        with stage('checkpoint'):
+            pending.flush()
+            save_state(ingest, args.state)
+
+    # Ctrl+C or a service manager's SIGTERM stops the loop between polls, so
+    # the last checkpoint never holds a half-ingested batch
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+    print(f"👀 Watching '{args.watch}' every {args.interval:g}s, publishing to '{args.snapshot}' (Ctrl+C to stop)")
+    unsaved = False
+    last_checkpoint = time.monotonic()
+    try:
+        while not stopping:
+            rows_read = ingest.poll(pending)
+            if rows_read or not os.path.exists(args.snapshot):
+                save_state(ingest.snapshot(), args.snapshot)
+            unsaved = unsaved or bool(rows_read)
+            if unsaved and time.monotonic() - last_checkpoint >= args.checkpoint:
+                checkpoint()
+                unsaved, last_checkpoint = False, time.monotonic()
+            if rows_read:
+                print(f"📥 {rows_read:,} rows read, {ingest.rows_cleaned:,} cleaned rows "
+                      f"of {ingest.rows_in:,} read so far")
+            if args.once:
+                break
+            time.sleep(args.interval)
+        if unsaved:
+            checkpoint()
+        if stopping:
+            print("👋 Stopped")
+    finally:
+        if writer is not None:
+            writer.close()
+        finish_profiling()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Load test of the dashboard: concurrent simulated users across several server processes.
+
+Each worker process stands for one Streamlit server: it opens --users
+sessions of dashboard.py (Streamlit's AppTest) and reruns each of them
+--reruns times with random date, item and location filters. The workers
+run side by side, so their reruns compete as concurrent users would.
+Once every worker is done, they all measure their memory at the same
+moment, with their sessions still open. PSS (proportional set size)
+splits the pages mapped by several processes between them, so it shows
+what the shared data mapping saves where RSS would count it in full.
+
+    python load_test.py --workers 4 --users 8 --reruns 10
+    python load_test.py --compare          # shared mapping vs private copies
+
+Reports the rerun latency (p50/p95, cold first loads apart) and the PSS
+and RSS of each worker, per session and in total.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+from datetime import timedelta
+import numpy as np
+
+from data_cache import SHARED_ENV
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py')
+# Seconds a single rerun may take before AppTest gives up
+RERUN_TIMEOUT = 300
+
+
+def process_memory_mb():
+    """
+    {'rss', 'pss'} of this process in MB (pss is None where /proc/self/smaps_rollup is unavailable)
+    """
+    memory = {'rss': None, 'pss': None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                field, value = line.split(':', 1)
+                if field.lower() in memory:
+                    memory[field.lower()] = int(value.split()[0]) / 1024
+        return memory
+    except OSError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_full_info()
+        return {'rss': info.rss / 2 ** 20, 'pss': getattr(info, 'pss', None) and info.pss / 2 ** 20}
+    except ImportError:
+        from profiling import peak_rss_mb
+        return {'rss': peak_rss_mb(), 'pss': None}
+
+
+class SimulatedUser:
+    """
+    One dashboard session (Streamlit's AppTest) that changes its filters at random on every rerun
+    """
+
+    def __init__(self, rng):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(DASHBOARD, default_timeout=RERUN_TIMEOUT)
+        self.rng = rng
+        self.errors = 0
+        self.cold = self._run()
+        # The dashboard opens on the whole date range and every item and location
+        self.active = bool(self.app.sidebar.date_input)
+        if self.active:
+            self.first, self.last = self.app.sidebar.date_input[0].value
+            self.items = self.app.sidebar.multiselect[0].options[1:]
+            self.locations = self.app.sidebar.multiselect[1].options[1:]
+
+    def _run(self):
+        start = time.perf_counter()
+        self.app.run()
+        elapsed = time.perf_counter() - start
+        self.errors += len(self.app.exception)
+        if not self.app.sidebar.date_input:
+            # The script stopped before drawing its filters
+            self.errors += 1
+            self.active = False
+        return elapsed
+
+    def rerun(self):
+        """
+        Pick new filters and rerun; returns the rerun's seconds
+        """
+        rng, sidebar = self.rng, self.app.sidebar
+        start_day = self.first + timedelta(days=rng.randrange((self.last - self.first).days + 1))
+        end_day = start_day + timedelta(days=rng.randrange((self.last - start_day).days + 1))
+        sidebar.date_input[0].set_value((start_day, end_day))
+        sidebar.multiselect[0].set_value(rng.sample(self.items, rng.randint(1, len(self.items)))
+                                         if rng.random() < 0.5 else ['All'])
+        sidebar.multiselect[1].set_value([rng.choice(self.locations)] if rng.random() < 0.3 else ['All'])
+        return self._run()
+
+
+def run_worker(worker, users, reruns, shared, seed, barrier, results):
+    """
+    One simulated server process: users open sessions rerun in turn, then a synchronized memory measurement
+    """
+    os.environ[SHARED_ENV] = '1' if shared else '0'
+    # Imported before the baseline, which is what a worker holds without any session
+    import streamlit.testing.v1
+
+    baseline = process_memory_mb()
+    # AppTest sessions are not thread-safe, so each worker reruns its sessions one after the other;
+    # the concurrency comes from the workers, which all run at once
+    sessions = [SimulatedUser(random.Random(seed * 1_000_003 + worker * 1_000 + user)) for user in range(users)]
+    latencies = []
+    for _ in range(reruns):
+        for session in sessions:
+            if session.active:
+                latencies.append(session.rerun())
+
+    # Measured while every worker is alive with all its sessions, so shared pages are split between them
+    barrier.wait()
+    loaded = process_memory_mb()
+    barrier.wait()
+    results.put({
+        'worker': worker,
+        'baseline': baseline,
+        'loaded': loaded,
+        'cold_s': [session.cold for session in sessions],
+        'rerun_s': latencies,
+        'errors': sum(session.errors for session in sessions),
+    })
+
+
+def _warm_up(shared):
+    # Builds the cache entry once, so the workers time loading it rather than racing to build it
+    os.environ[SHARED_ENV] = '1' if shared else '0'
+    SimulatedUser(random.Random(0))
+
+
+def run_load_test(workers, users, reruns, shared=True, seed=0):
+    """
+    Run the workers side by side and summarize their latencies and memory
+    """
+    # Spawned, so no worker inherits pages from this process
+    context = multiprocessing.get_context('spawn')
+    warm_up = context.Process(target=_warm_up, args=(shared,))
+    warm_up.start()
+    warm_up.join()
+
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(worker, users, reruns, shared, seed, barrier, results))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    reports = []
+    while len(reports) < len(processes):
+        try:
+            reports.append(results.get(timeout=1))
+        except queue.Empty:
+            # A worker that died (e.g. killed for lack of memory) would leave the others waiting at the barrier
+            failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                barrier.abort()
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError(f"A worker exited with code {failed[0]}")
+    for process in processes:
+        process.join()
+
+    reruns_s = np.array([latency for report in reports for latency in report['rerun_s']])
+    cold_s = np.array([cold for report in reports for cold in report['cold_s']])
+    summary = {
+        'mode': 'shared' if shared else 'private',
+        'workers': workers,
+        'users_per_worker': users,
+        'reruns': len(reruns_s),
+        'errors': sum(report['errors'] for report in reports),
+        'cold_p50_s': float(np.median(cold_s)) if len(cold_s) else None,
+        'rerun_p50_s': float(np.percentile(reruns_s, 50)) if len(reruns_s) else None,
+        'rerun_p95_s': float(np.percentile(reruns_s, 95)) if len(reruns_s) else None,
+    }
+    for measure in ['pss', 'rss']:
+        loaded = [report['loaded'][measure] for report in reports]
+        added = [report['loaded'][measure] - report['baseline'][measure] for report in reports
+                 if report['loaded'][measure] is not None]
+        if None in loaded:
+            continue
+        summary[f'{measure}_per_worker_mb'] = float(np.mean(loaded))
+        summary[f'{measure}_total_mb'] = float(np.sum(loaded))
+        # What the sessions added on top of a worker that only imported Streamlit
+        summary[f'{measure}_per_session_mb'] = float(np.mean(added)) / users
+    return summary
+
+
+def _seconds(value, digits):
+    # Latencies are None when no session got that far
+    return 'n/a' if value is None else f'{value:.{digits}f}s'
+
+
+def print_summary(summary):
+    print(f"\n📊 {summary['mode']}: {summary['workers']} workers x {summary['users_per_worker']} users, "
+          f"{summary['reruns']:,} reruns, {summary['errors']} errors")
+    print(f"   ⏱️  cold load p50 {_seconds(summary['cold_p50_s'], 2)}, "
+          f"rerun p50 {_seconds(summary['rerun_p50_s'], 3)}, p95 {_seconds(summary['rerun_p95_s'], 3)}")
+    for measure in ['pss', 'rss']:
+        if f'{measure}_total_mb' in summary:
+            print(f"   🧠 {measure.upper()}: {summary[f'{measure}_per_worker_mb']:.1f} MB per worker, "
+                  f"{summary[f'{measure}_per_session_mb']:.1f} MB per session, "
+                  f"{summary[f'{measure}_total_mb']:.1f} MB in total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dashboard memory and rerun latency under concurrent users")
+    parser.add_argument('--workers', type=int, default=2, help="Simulated server processes")
+    parser.add_argument('--users', type=int, default=4, help="Concurrent sessions per worker")
+    parser.add_argument('--reruns', type=int, default=10, help="Filter changes per session")
+    parser.add_argument('--private', action='store_true', help="Give every worker a private copy of the data")
+    parser.add_argument('--compare', action='store_true', help="Run with the shared mapping, then with private copies")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Also write the summaries to this JSON file")
+    args = parser.parse_args()
+
+    modes = [True, False] if args.compare else [not args.private]
+    summaries = []
+    for shared in modes:
+        print(f"🚦 {'Shared mapping' if shared else 'Private copies'}: {args.workers} workers x {args.users} users...")
+        summaries.append(run_load_test(args.workers, args.users, args.reruns, shared, args.seed))
+        print_summary(summaries[-1])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'argv': sys.argv, 'summaries': summaries}, f, indent=2)
+        print(f"\n💾 Summaries written to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
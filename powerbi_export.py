@@ -0,0 +1,216 @@
+"""
+Star-schema export of the analyzed sales for Power BI (or any BI tool).
+
+Instead of a copy of analyzed_cafe_sales, powerbi_data/ gets
+
+    FactSales          one row per transaction: Transaction ID, integer
+                       Date/Item/Location/Payment Method keys and the measures
+    DimDate            every day from the first to the last sale
+    DimItem, DimLocation, DimPaymentMethod
+
+as Parquet (CSV without pyarrow, or with --format csv). Key columns have
+the same name in the fact and dimension tables, so Power BI detects the
+relationships on import; key 0 of each dimension stands for a missing
+value. The source is read and the fact table written one chunk at a
+time, and nothing is written when the source has not changed since the
+last export. cafe_sales.pbids opens Power BI Desktop on the folder.
+
+    python powerbi_export.py --format parquet
+"""
+import argparse
+import json
+import os
+import time
+import pandas as pd
+
+from data_cache import read_record, unchanged_since, write_record
+from report_writer import content_digest
+from sales_schema import CATEGORICAL_COLUMNS
+from sales_storage import SalesWriter, columnar_available, find_dataset, iter_sales
+
+POWERBI_DIR = 'powerbi_data'
+MANIFEST_FILE = 'export_manifest.json'
+DATA_SOURCE_FILE = 'cafe_sales.pbids'
+# Bump when the tables change shape, so existing exports are redone
+EXPORT_VERSION = 3
+EXPORT_CHUNKSIZE = 500_000
+
+DIMENSIONS = {'Item': 'DimItem', 'Location': 'DimLocation', 'Payment Method': 'DimPaymentMethod'}
+MEASURES = ['Quantity', 'Price Per Unit', 'Total Spent']
+UNKNOWN = 'Unknown'
+
+
+def date_keys(dates):
+    """
+    yyyymmdd integer keys of dates, 0 for a missing date (DimDate's Unknown row)
+    """
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).fillna(0).astype('int32')
+
+
+def fact_rows(chunk):
+    """
+    FactSales rows of a typed chunk of transactions
+    """
+    fact = pd.DataFrame({
+        'Transaction ID': chunk['Transaction ID'].astype(str),
+        'Date Key': date_keys(chunk['Transaction Date']),
+    })
+    for column in DIMENSIONS:
+        # Category codes are fixed by the schema, so keys are stable between exports
+        fact[f'{column} Key'] = (chunk[column].cat.codes + 1).astype('int8')
+    for column in MEASURES:
+        fact[column] = chunk[column].astype('float64')
+    return fact.reset_index(drop=True)
+
+
+def dimension_table(column):
+    values = [UNKNOWN] + CATEGORICAL_COLUMNS[column]
+    return pd.DataFrame({f'{column} Key': range(len(values)), column: values})
+
+
+def date_dimension(first, last):
+    """
+    One row per day from first to last, plus key 0 for a missing date
+    """
+    dates = pd.Series(pd.date_range(first, last, freq='D') if first is not None else [], dtype='datetime64[ns]')
+    table = pd.DataFrame({
+        'Date Key': date_keys(dates),
+        'Date': dates,
+        'Year': dates.dt.year.astype('Int16'),
+        'Quarter': dates.dt.quarter.astype('Int8'),
+        'Month Number': dates.dt.month.astype('Int8'),
+        'Month': dates.dt.month_name(),
+        'Day': dates.dt.day.astype('Int8'),
+        'Day of Week Number': (dates.dt.dayofweek + 1).astype('Int8'),
+        'Day of Week': dates.dt.day_name(),
+    })
+    unknown = pd.DataFrame({'Date Key': [0], 'Month': [UNKNOWN], 'Day of Week': [UNKNOWN]})
+    return pd.concat([unknown, table], ignore_index=True)[table.columns].astype(table.dtypes.to_dict())
+
+
+def _write_table(df, path):
+    # Small tables in one go, written as they are (not with the sales column types)
+    stem, ext = os.path.splitext(path)
+    tmp_path = f'{stem}.tmp{ext}'
+    if ext == '.parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+class _TableWriter:
+    """
+    A SalesWriter into a temporary file that replaces path once every chunk is written
+    """
+
+    def __init__(self, path):
+        stem, ext = os.path.splitext(path)
+        # Money at full precision, so Power BI sums match the analysis reports
+        self._writer = SalesWriter(f'{stem}.tmp{ext}', money_dtype='float64')
+        self.path = stem + os.path.splitext(self._writer.path)[1]
+
+    def write(self, df):
+        self._writer.write(df)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._writer.close()
+        if exc_type is None:
+            os.replace(self._writer.path, self.path)
+        elif os.path.exists(self._writer.path):
+            os.remove(self._writer.path)
+
+
+def write_data_source(output_dir):
+    """
+    Write a Power BI data source file (.pbids) pointing at the exported tables; returns its path
+    """
+    path = os.path.join(output_dir, DATA_SOURCE_FILE)
+    with open(path, 'w') as f:
+        json.dump({
+            'version': '0.1',
+            'connections': [{
+                'details': {'protocol': 'folder', 'address': {'path': os.path.abspath(output_dir)}},
+                'mode': None,
+            }],
+        }, f, indent=2)
+    return path
+
+
+def export_star_schema(source, output_dir=POWERBI_DIR, fmt=None, chunksize=EXPORT_CHUNKSIZE, force=False):
+    """
+    Export source as a star schema into output_dir, unless the last export was of the same content.
+
+    Returns (paths of the tables, whether they were written).
+    """
+    fmt = fmt or ('parquet' if columnar_available() else 'csv')
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+
+    manifest = read_record(manifest_path)
+    if manifest is not None and (manifest.get('version') != EXPORT_VERSION or manifest.get('format') != fmt
+                                 or not all(os.path.exists(path) for path in manifest['tables'].values())):
+        manifest = None
+    # The analysis manifest saves re-hashing a source it wrote
+    unchanged, source_state = unchanged_since(source, None if force else manifest, content_digest)
+    if unchanged:
+        return manifest['tables'], False
+
+    tables = {}
+    first = last = None
+    rows = 0
+    with _TableWriter(os.path.join(output_dir, f'FactSales.{fmt}')) as fact:
+        for chunk in iter_sales(source, chunksize, money_dtype='float64'):
+            dates = chunk['Transaction Date'].dropna()
+            if len(dates):
+                first = min(first, dates.min()) if first is not None else dates.min()
+                last = max(last, dates.max()) if last is not None else dates.max()
+            fact.write(fact_rows(chunk))
+            rows += len(chunk)
+    tables['FactSales'] = fact.path
+
+    tables['DimDate'] = _write_table(date_dimension(first, last), os.path.join(output_dir, f'DimDate.{fmt}'))
+    for column, name in DIMENSIONS.items():
+        tables[name] = _write_table(dimension_table(column), os.path.join(output_dir, f'{name}.{fmt}'))
+    write_data_source(output_dir)
+
+    write_record(manifest_path, {
+        'version': EXPORT_VERSION,
+        'format': fmt,
+        'source': os.path.abspath(source),
+        **source_state,
+        'rows': rows,
+        'tables': tables,
+    })
+    return tables, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the analyzed cafe sales as a star schema for Power BI")
+    parser.add_argument('--source', help="Analyzed dataset (default: freshest analyzed_cafe_sales.*)")
+    parser.add_argument('--output-dir', default=POWERBI_DIR)
+    parser.add_argument('--format', choices=['parquet', 'csv'], help="Default: parquet when pyarrow is installed")
+    parser.add_argument('--chunksize', type=int, default=EXPORT_CHUNKSIZE, help="Rows read and written at a time")
+    parser.add_argument('--force', action='store_true', help="Export even if the source did not change")
+    args = parser.parse_args()
+
+    source = args.source or find_dataset('analyzed_cafe_sales.csv')
+    if source is None:
+        print("❌ Could not find analyzed data. Please run the analysis first.")
+        return
+
+    start = time.perf_counter()
+    tables, written = export_star_schema(source, args.output_dir, args.format, args.chunksize, args.force)
+    if written:
+        print(f"✅ Exported {source} to {len(tables)} tables in '{args.output_dir}' "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        print(f"⏭️  {source} is unchanged since the last export, nothing to do")
+
+
+if __name__ == "__main__":
+    main()
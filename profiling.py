@@ -0,0 +1,322 @@
+"""
+Per-stage instrumentation for the cleaning, analysis and dashboard code.
+
+Code marks its stages with
+
+    with stage('numeric coercion', rows_in=len(df)) as s:
+        ...
+        s.rows_out = len(df)
+
+which costs nothing unless profiling was started for the run (--profile
+on the command line, or the CAFE_SALES_PROFILE environment variable set to
+a directory). A profiled run records wall time, CPU time, the peak
+resident set size during the stage, the resident set size at its end and
+how much that grew, and rows in/out for every stage, nested stages being
+named parent/child, and
+writes them to <dir>/<script>-<timestamp>.json and .csv. --cprofile (or
+CAFE_SALES_CPROFILE=1) also dumps a cProfile file next to them, which
+snakeviz or flameprof turn into a flame graph.
+
+Stages run in worker processes are recorded there with run_profiled and
+merged into the run with add_records, nested under the stage that waited
+for them.
+"""
+import cProfile
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = 'CAFE_SALES_PROFILE'
+CPROFILE_ENV = 'CAFE_SALES_CPROFILE'
+PROFILE_DIR = 'profiles'
+REPORT_FIELDS = ['stage', 'wall_s', 'cpu_s', 'peak_rss_mb', 'rss_mb', 'rss_delta_mb', 'rows_in', 'rows_out']
+# Seconds between RSS samples where the kernel's high-water mark cannot be reset
+SAMPLE_INTERVAL_S = 0.005
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB (None where unavailable)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process right now, in MB (None where unavailable)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        return None
+
+
+def reset_rss_high_water_mark():
+    """
+    Reset the kernel's peak RSS of this process to its current RSS (Linux); False where it cannot
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_high_water_mark_mb():
+    """
+    Peak RSS of this process since the last reset, in MB (Linux)
+    """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+class RssSampler:
+    """
+    Peak RSS from a background thread polling it, for systems without a resettable high-water mark
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0.0, rss)
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        rss = current_rss_mb()
+        return max(self.peak, rss) if self.peak is not None and rss is not None else self.peak
+
+
+_high_water_mark_resettable = None
+
+
+def high_water_mark_resettable():
+    global _high_water_mark_resettable
+    if _high_water_mark_resettable is None:
+        try:
+            _high_water_mark_resettable = reset_rss_high_water_mark() and rss_high_water_mark_mb() is not None
+        except (OSError, ValueError):
+            _high_water_mark_resettable = False
+    return _high_water_mark_resettable
+
+
+def stage_record(stage, wall_s, cpu_s, rows_in=None, rows_out=None, rss_mb=None, rss_delta_mb=None,
+                 peak_rss_mb=None):
+    """
+    One row of a profile report (for stages timed by other means, e.g. a job on a writer thread)
+    """
+    return {
+        'stage': stage,
+        'wall_s': round(wall_s, 6),
+        'cpu_s': round(cpu_s, 6),
+        'peak_rss_mb': peak_rss_mb,
+        'rss_mb': rss_mb,
+        'rss_delta_mb': rss_delta_mb,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+    }
+
+
+class StageRecord:
+    def __init__(self, name, rows_in=None, rows_out=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+
+
+class StageProfiler:
+    """
+    Collects one record per stage of a run; disabled when output_dir is None, unless collect is set
+    (stages are then recorded but no report is written)
+    """
+
+    def __init__(self, run_name=None, output_dir=None, cprofile=False, collect=False):
+        self.run_name = run_name
+        self.output_dir = output_dir
+        self.collect = collect
+        self.records = []
+        self._stack = []
+        # Peak RSS so far of each open stage (or its RssSampler)
+        self._peaks = []
+        now = time.time()
+        self._started = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now % 1 * 1000):03d}'
+        self._cprofile = cProfile.Profile() if cprofile and output_dir is not None else None
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    @property
+    def enabled(self):
+        return self.output_dir is not None or self.collect
+
+    @contextmanager
+    def stage(self, name, rows_in=None, rows_out=None):
+        record = StageRecord(name, rows_in, rows_out)
+        if not self.enabled:
+            yield record
+            return
+
+        self._stack.append(name)
+        rss = current_rss_mb()
+        self._start_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            # The stage's own peak (temporaries it freed included), and what it kept
+            peak = self._stop_peak()
+            rss_after = current_rss_mb()
+            self.records.append(stage_record(
+                '/'.join(self._stack), wall, cpu, record.rows_in, record.rows_out,
+                rss_after and round(rss_after, 1), rss_after and rss and round(rss_after - rss, 1),
+                peak and round(peak, 1)))
+            self._stack.pop()
+
+    def _start_peak(self):
+        if not high_water_mark_resettable():
+            self._peaks.append(RssSampler())
+            return
+        # The mark is process-wide: fold the enclosing stage's peak so far in before resetting it
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], rss_high_water_mark_mb())
+        reset_rss_high_water_mark()
+        self._peaks.append(0.0)
+
+    def _stop_peak(self):
+        peak = self._peaks.pop()
+        if isinstance(peak, RssSampler):
+            return peak.stop()
+        peak = max(peak, rss_high_water_mark_mb())
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+
+    def add_records(self, records):
+        """
+        Add stages recorded elsewhere (a worker process or thread), nested under the current stage
+        """
+        if not self.enabled:
+            return
+        for record in records:
+            self.records.append({**record, 'stage': '/'.join(self._stack + [record['stage']])})
+
+    def write_report(self):
+        """
+        Write the JSON and CSV reports (and the cProfile dump); returns the paths written
+        """
+        if self.output_dir is None:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f'{self.run_name}-{self._started}')
+        written = [base + '.json', base + '.csv']
+
+        with open(base + '.json', 'w') as f:
+            json.dump({'run': self.run_name, 'started': self._started, 'argv': sys.argv,
+                       'stages': self.records}, f, indent=2)
+        with open(base + '.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(base + '.prof')
+            written.append(base + '.prof')
+        return written
+
+
+_active = StageProfiler()
+
+
+def start_profiling(run_name, output_dir=None, cprofile=False):
+    """
+    Start recording stages for this run into output_dir (default: $CAFE_SALES_PROFILE, if set)
+    """
+    global _active
+    output_dir = output_dir or os.environ.get(PROFILE_ENV) or None
+    cprofile = cprofile or os.environ.get(CPROFILE_ENV) == '1'
+    _active = StageProfiler(run_name, output_dir, cprofile)
+    return _active
+
+
+def finish_profiling():
+    """
+    Write the active run's reports, stop recording and return the paths written
+    """
+    global _active
+    written = _active.write_report()
+    _active = StageProfiler()
+    return written
+
+
+def stage(name, rows_in=None, rows_out=None):
+    """
+    Context manager recording a stage of the active run (a no-op when profiling is off);
+    rows_out can be given up front for stages that keep every row
+    """
+    return _active.stage(name, rows_in, rows_out)
+
+
+def profiling_enabled():
+    return _active.enabled
+
+
+def add_records(records):
+    """
+    Merge stage records returned by run_profiled (or built with stage_record) into the active run
+    """
+    _active.add_records(records)
+
+
+def run_profiled(function, *args):
+    """
+    Call function(*args) recording its stages apart; returns (result, stage records).
+
+    Meant for worker processes, whose stages would otherwise be lost: the
+    records go back with the result and the parent passes them to add_records.
+    """
+    global _active
+    previous = _active
+    _active = StageProfiler(collect=True)
+    try:
+        result = function(*args)
+        return result, _active.records
+    finally:
+        _active = previous
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const=PROFILE_DIR, metavar='DIR',
+                        help=f"Write a per-stage timing and memory report to DIR (default: {PROFILE_DIR})")
+    parser.add_argument('--cprofile', action='store_true', help="With --profile, also dump a cProfile file")
@@ -0,0 +1,178 @@
+"""
+Concurrent, atomic writing of the analysis outputs, with a manifest of their content.
+
+ReportWriter writes the artifacts of a run (report CSVs, key_insights.txt,
+the combined chart, the analyzed transactions) on a pool of threads. Each
+one goes to a temporary file that is renamed over its target once it is
+complete, so a reader never sees a half-written file. When every write
+is done, manifest.json in the output directory records the size, mtime
+and SHA-256 of each file.
+
+A file whose new content is the same as what is already on disk is not
+replaced, so it keeps its mtime and consumers that key on a file's
+fingerprint (the dashboard, the Power BI export) see no change at all.
+content_digest gives them the SHA-256 of a file the manifest still
+describes without reading it.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data_cache import file_digest, file_fingerprint, read_record, write_record
+from profiling import stage_record
+
+MANIFEST_FILE = 'manifest.json'
+# The manifest of the analysis outputs when run with the default output directory
+MANIFEST_PATH = os.path.join('analysis_results', MANIFEST_FILE)
+MANIFEST_VERSION = 1
+DEFAULT_WORKERS = 8
+
+
+def read_manifest(manifest_path=MANIFEST_PATH):
+    """
+    The files recorded in a manifest, keyed by their path relative to the manifest's directory
+    """
+    manifest = read_record(manifest_path)
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest['files']
+
+
+def _manifest_key(path, manifest_path):
+    return os.path.relpath(path, os.path.dirname(manifest_path) or '.').replace(os.sep, '/')
+
+
+def recorded_digest(path, manifest_path=MANIFEST_PATH, files=None):
+    """
+    SHA-256 of path as recorded in the manifest, or None if it is not there or changed since
+    """
+    entry = (read_manifest(manifest_path) if files is None else files).get(_manifest_key(path, manifest_path))
+    if entry is None or not os.path.exists(path) or entry['fingerprint'] != list(file_fingerprint(path)):
+        return None
+    return entry['sha256']
+
+
+def content_digest(path, manifest_path=MANIFEST_PATH):
+    """
+    SHA-256 of path, taken from the manifest when it describes the file as it is now
+    """
+    return recorded_digest(path, manifest_path) or file_digest(path)
+
+
+class ReportWriter:
+    """
+    Writes files concurrently and atomically, and records them in output_dir/manifest.json on close().
+
+        with ReportWriter('analysis_results') as writer:
+            writer.write_csv('analysis_results/summary.csv', summary, index=False)
+            writer.write_text('analysis_results/key_insights.txt', text)
+    """
+
+    def __init__(self, output_dir, workers=DEFAULT_WORKERS):
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        self._previous = read_manifest(self.manifest_path)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._jobs = {}
+        # Per job: rows written (when known) and (wall, CPU) seconds on its thread
+        self._rows = {}
+        self._timings = {}
+        self.replaced = {}
+        self.workers = workers
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _write(self, path, write):
+        stem, ext = os.path.splitext(path)
+        # The extension is kept, for writers that pick the format from it
+        tmp_path = f'{stem}.{os.getpid()}-{threading.get_ident()}.tmp{ext}'
+        try:
+            write(tmp_path)
+            digest = file_digest(tmp_path)
+            if os.path.exists(path) and os.path.getsize(path) == os.path.getsize(tmp_path):
+                if (recorded_digest(path, self.manifest_path, self._previous) or file_digest(path)) == digest:
+                    return digest, False
+            os.replace(tmp_path, path)
+            return digest, True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _timed(self, path, job, *args):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return job(*args)
+        finally:
+            self._timings[path] = (time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def submit(self, path, write, rows=None):
+        """
+        Queue write(tmp_path), which writes the new content of path (rows rows, if known) to tmp_path
+        """
+        self._rows[path] = rows
+        self._jobs[path] = self._pool.submit(self._timed, path, self._write, path, write)
+
+    def write_csv(self, path, frame, **to_csv_args):
+        self.submit(path, lambda tmp_path: frame.to_csv(tmp_path, **to_csv_args), len(frame))
+
+    def write_text(self, path, text):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+        self.submit(path, write)
+
+    def record(self, path):
+        """
+        Add a file written by other means (e.g. a chart tile) to the manifest
+        """
+        self._rows[path] = None
+        self._jobs[path] = self._pool.submit(
+            self._timed, path,
+            lambda: (recorded_digest(path, self.manifest_path, self._previous) or file_digest(path), None))
+
+    def close(self):
+        """
+        Wait for every write, save the manifest and return {path: whether it was replaced}
+        (None for the files that were only recorded)
+        """
+        self._pool.shutdown(wait=True)
+        results = {path: job.result() for path, job in self._jobs.items()}
+
+        # Files of earlier runs that were not rewritten this time stay listed while unchanged
+        files = {key: entry for key, entry in self._previous.items()
+                 if recorded_digest(os.path.join(os.path.dirname(self.manifest_path), key),
+                                    self.manifest_path, self._previous)}
+        for path, (digest, _) in results.items():
+            files[_manifest_key(path, self.manifest_path)] = {
+                'sha256': digest,
+                'size': os.path.getsize(path),
+                'fingerprint': list(file_fingerprint(path)),
+            }
+        write_record(self.manifest_path, {'version': MANIFEST_VERSION, 'files': files})
+        self.replaced = {path: replaced for path, (_, replaced) in results.items()}
+        return self.replaced
+
+    def stage_records(self):
+        """
+        A profiling record per job of the closed writer: its thread's wall and CPU time, and
+        its rows in and rows actually written (0 when the file was left unchanged)
+        """
+        records = []
+        for path, replaced in self.replaced.items():
+            wall, cpu = self._timings[path]
+            rows = self._rows[path]
+            name = os.path.relpath(path, os.path.dirname(self.manifest_path))
+            records.append(stage_record(f'{"record" if replaced is None else "write"} {name}', wall, cpu, rows,
+                                        rows if replaced or rows is None else 0))
+        return records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True, cancel_futures=True)
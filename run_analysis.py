@@ -1,31 +1,24 @@
+import argparse
 import os
 import subprocess
-import pandas as pd
-import analyze_cafe_sales  # Import your existing analysis
+import analyze_cafe_sales
 from pathlib import Path
+from powerbi_export import DATA_SOURCE_FILE, POWERBI_DIR, export_star_schema, write_data_source
+from sales_storage import find_dataset
 
 def prepare_powerbi_data():
     """
-    Run the cafe sales analysis and prepare data for Power BI
+    Export the analyzed data for Power BI as a star schema (skipped when it did not change)
     """
-    # Create output directories
-    output_dir = Path("powerbi_data")
-    output_dir.mkdir(exist_ok=True)
-    
-    # Run the analysis (importing the module will run the analysis)
-    # The analysis results should be in the 'analysis_results' directory
-    
-    # Prepare data for Power BI
-    # Assuming your analysis saves to analyzed_cafe_sales.csv
-    if os.path.exists('analyzed_cafe_sales.csv'):
-        df = pd.read_csv('analyzed_cafe_sales.csv')
-        
-        # Save a version optimized for Power BI
-        powerbi_file = output_dir / 'cafe_sales_powerbi.csv'
-        df.to_csv(powerbi_file, index=False)
-        
-        print(f"✅ Analysis complete! Data saved to: {powerbi_file}")
-        return str(powerbi_file)
+    # The analysis saves analyzed_cafe_sales as CSV, Parquet or Feather
+    analyzed_path = find_dataset('analyzed_cafe_sales.csv')
+    if analyzed_path is not None:
+        tables, written = export_star_schema(analyzed_path, POWERBI_DIR)
+        if written:
+            print(f"✅ Analysis complete! {len(tables)} tables saved to: {POWERBI_DIR}")
+        else:
+            print(f"⏭️  Power BI tables in {POWERBI_DIR} are up to date")
+        return tables['FactSales']
     else:
         print("❌ Could not find analyzed data. Please run the analysis first.")
         return None
@@ -40,17 +33,15 @@ def open_powerbi():
         r"C:\Program Files (x86)\Microsoft Power BI Desktop\bin\PBIDesktop.exe"
     ]
     
-    # Path to the Power BI dashboard file
-    pbix_file = Path("powerbi_data/cafe_sales_dashboard.pbix")
-    
-    if not pbix_file.exists():
-        print("⚠️  Power BI template not found. Creating a basic one...")
-        create_powerbi_template()
+    # A Power BI data source file: opens Power BI Desktop connected to the exported tables
+    pbids_file = Path(POWERBI_DIR) / DATA_SOURCE_FILE
+    if not pbids_file.exists():
+        write_data_source(POWERBI_DIR)
     
-    # First try to open with the .pbix file directly
+    # First try to open the .pbids file directly
     try:
         print("🔁 Opening Power BI dashboard...")
-        subprocess.Popen(['start', '', str(pbix_file.absolute())], shell=True)
+        subprocess.Popen(['start', '', str(pbids_file.absolute())], shell=True)
         return
     except Exception as e:
         print(f"❌ Error opening Power BI file directly: {e}")
@@ -60,48 +51,25 @@ def open_powerbi():
         if os.path.exists(path):
             try:
                 print(f"🔁 Opening Power BI Desktop with the dashboard...")
-                subprocess.Popen([path, str(pbix_file.absolute())])
+                subprocess.Popen([path, str(pbids_file.absolute())])
                 return
             except Exception as e:
                 print(f"❌ Error opening Power BI Desktop: {e}")
     
     print("⚠️  Could not find Power BI Desktop. Please install it or open the file manually:")
-    print(f"   {pbix_file.absolute()}")
-
-def create_powerbi_template():
-    """
-    Create a basic Power BI template file
-    """
-    template = """{
-        "version": "1.0",
-        "sections": [
-            {
-                "displayName": "Cafe Sales Analysis",
-                "position": {"x": 0, "y": 0, "z": 0},
-                "visualContainers": [
-                    {
-                        "name": "visualContainer1",
-                        "filters": {},
-                        "config": "{\"name\":\"visualContainer1\",\"layouts\":[{\"id\":0,\"position\":{\"x\":0,\"y\":0,\"z\":0},\"width\":6,\"height\":6}],\"config\":\"{\\\"name\\\":\\\"visualContainer1\\\",\\\"singleVisual\\\":{\\\"visualType\\\":\\\"tableEx\\\",\\\"projections\\\":{\\\"Values\\\":[{\\\"queryRef\\\":\\\"Product\\\"},{\\\"queryRef\\\":\\\"Total Spent\\\"}]}}}\"}"
-                    }
-                ]
-            }
-        ]
-    }"""
-    
-    # Create the directory if it doesn't exist
-    os.makedirs("powerbi_data", exist_ok=True)
-    
-    # Save the template
-    with open("powerbi_data/cafe_sales_dashboard.pbix", 'w') as f:
-        f.write(template)
-    
-    print("✅ Created basic Power BI template")
+    print(f"   {pbids_file.absolute()}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the cafe sales analysis and open it in Power BI")
+    parser.add_argument('--export-only', action='store_true',
+                        help="Reuse the existing analysis results instead of running the analysis again")
+    args = parser.parse_args()
+
     print("🚀 Starting Cafe Sales Analysis for Power BI...")
     
-    # Run the analysis
+    # Run the analysis (results go to the 'analysis_results' directory)
+    if not args.export_only:
+        analyze_cafe_sales.run_pipeline()
     data_file = prepare_powerbi_data()
     
     if data_file:
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Grain of the cube: one row per day x hour of day x Item x Payment Method x Location
+# (every sale of date-only data falls in hour 0)
+CUBE_KEYS = ['Transaction Date', 'Hour', 'Item', 'Payment Method', 'Location']
+
+# Additive measures kept per cube row. 'Sales Count' counts rows with a
+# Total Spent value (what pandas' count/mean use), 'Row Count' counts all rows.
+# 'Transaction Count' is the number of distinct Transaction IDs in the row; it
+# only adds up across rows when every ID appears in a single cube row, which
+# holds for cleaned data since the cleaner de-duplicates IDs.
+CUBE_MEASURES = ['Total Spent', 'Quantity', 'Sales Count', 'Row Count', 'Transaction Count']
+
+
+def build_cube(df):
+    """
+    Aggregate a transaction frame to the cube grain.
+
+    Every measure is summed when cube rows are combined, so cubes built from
+    separate batches of rows can be merged with combine_cubes and give the
+    same reports as a cube built from all rows at once. Timestamps are
+    split into the day ('Transaction Date') and the hour of day ('Hour').
+    """
+    dates = df['Transaction Date']
+    df = df.assign(**{
+        'Transaction Date': dates.dt.normalize(),
+        'Hour': dates.dt.hour.astype('Int8'),
+        'Total Spent': df['Total Spent'].astype('float64'),
+        'Quantity': df['Quantity'].astype('float64'),
+    })
+    cube = df.groupby(CUBE_KEYS, observed=True, dropna=False).agg(**{
+        'Total Spent': ('Total Spent', 'sum'),
+        'Quantity': ('Quantity', 'sum'),
+        'Sales Count': ('Total Spent', 'count'),
+        'Row Count': ('Transaction ID', 'size'),
+        'Transaction Count': ('Transaction ID', 'nunique'),
+    })
+    return cube.reset_index()
+
+
+def combine_cubes(*cubes):
+    """
+    Merge cubes built from disjoint sets of transactions
+    """
+    cubes = [cube for cube in cubes if cube is not None and len(cube)]
+    if not cubes:
+        return None
+    if len(cubes) == 1:
+        return cubes[0]
+    combined = pd.concat(cubes, ignore_index=True)
+    return combined.groupby(CUBE_KEYS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+
+
+def _sum_measures(cube, by):
+    grouped = cube.groupby(by, observed=True)[CUBE_MEASURES].sum()
+    grouped['mean'] = grouped['Total Spent'] / grouped['Sales Count']
+    return grouped
+
+
+def monthly_revenue(cube):
+    dates = cube['Transaction Date']
+    monthly = cube.assign(Year=dates.dt.year, Month=dates.dt.month_name()).groupby(
+        ['Year', 'Month', pd.Grouper(key='Transaction Date', freq='M')]
+    )['Total Spent'].sum().reset_index()
+    return monthly.sort_values('Transaction Date')
+
+
+def daily_patterns(cube):
+    grouped = _sum_measures(cube, cube['Transaction Date'].dt.day_name().rename('DayOfWeek'))
+    patterns = pd.DataFrame({
+        'sum': grouped['Total Spent'],
+        'count': grouped['Sales Count'],
+        'mean': grouped['mean'],
+    })
+    return patterns.reindex(DAY_ORDER)
+
+
+def product_metrics(cube):
+    grouped = _sum_measures(cube, 'Item')
+    metrics = pd.DataFrame({
+        'Quantity': grouped['Quantity'],
+        'Total Spent': grouped['Total Spent'],
+        'Transaction ID': grouped['Row Count'],
+    }).sort_values('Total Spent', ascending=False)
+    metrics['Avg. Price'] = metrics['Total Spent'] / metrics['Quantity']
+    metrics['Avg. Transaction Value'] = metrics['Total Spent'] / metrics['Transaction ID']
+    return metrics
+
+
+def spend_breakdown(cube, column):
+    """
+    Sum, mean and count of Total Spent per value of column (Payment Method, Location...)
+    """
+    grouped = _sum_measures(cube, column)
+    breakdown = pd.DataFrame({
+        ('Total Spent', 'sum'): grouped['Total Spent'],
+        ('Total Spent', 'mean'): grouped['mean'],
+        ('Total Spent', 'count'): grouped['Sales Count'],
+    })
+    return breakdown.sort_values(('Total Spent', 'sum'), ascending=False)
+
+
+def hour_weekday_grid(frame, value='Total Spent'):
+    """
+    Sum of value per day of week (rows, in DAY_ORDER) and hour of day (columns, the hours that occur).
+
+    frame is a cube, whose rows are already binned by hour, or a transaction
+    frame, whose timestamps are binned here; either way the 7 x 24 cells are
+    filled by one bincount instead of a pivot over the rows.
+    """
+    dates = frame['Transaction Date']
+    hours = (frame['Hour'] if 'Hour' in frame else dates.dt.hour).to_numpy(dtype='float64', na_value=np.nan)
+    weekdays = dates.dt.dayofweek.to_numpy(dtype='float64', na_value=np.nan)
+    keep = ~(np.isnan(hours) | np.isnan(weekdays))
+    cells = (weekdays[keep] * 24 + hours[keep]).astype(np.int64)
+    values = np.nan_to_num(frame[value].to_numpy(dtype='float64', na_value=np.nan)[keep])
+    sums = np.bincount(cells, weights=values, minlength=len(DAY_ORDER) * 24).reshape(len(DAY_ORDER), 24)
+    present = np.unique(hours[keep]).astype(np.int64)
+    return pd.DataFrame(sums[:, present], index=pd.Index(DAY_ORDER, name='DayOfWeek'),
+                        columns=pd.Index(present, name='Hour'))
@@ -0,0 +1,151 @@
+import tempfile
+import numpy as np
+import pandas as pd
+
+from sales_schema import decode_transaction_ids
+
+CODED_COLUMNS = ['Item', 'Payment Method', 'Location']
+EXPORT_CHUNKSIZE = 200_000
+
+
+class IndexedSales:
+    """
+    A sales frame sorted by date, with its categorical columns kept as integer codes.
+
+    Date ranges are found with a binary search on the sorted dates and
+    category filters become a lookup into a small boolean table per column,
+    so a filter only touches the rows inside the date range and never
+    builds string or datetime.date temporaries.
+
+    expand, if given, turns stored rows into the rows shown and exported
+    (e.g. expand_compact_columns for a frame loaded with compact types); it
+    is applied to one page or export chunk at a time.
+    """
+
+    def __init__(self, df, date_column='Transaction Date', coded_columns=CODED_COLUMNS, expand=None):
+        self.date_column = date_column
+        self.expand = expand
+        self.frame = df.sort_values(date_column, kind='stable').reset_index(drop=True)
+        # NaT sorts last, so the valid dates form a sorted prefix
+        self.dates = self.frame[date_column].to_numpy(dtype='datetime64[ns]')
+        self.n_dated = int(np.count_nonzero(~np.isnat(self.dates)))
+
+        self.categories = {}
+        self.codes = {}
+        for column in coded_columns:
+            values = self.frame[column].astype('category')
+            self.categories[column] = list(values.cat.categories)
+            self.codes[column] = values.cat.codes.to_numpy()
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return list(self._rows(slice(0, 0)).columns)
+
+    def _rows(self, positions, columns=None):
+        if columns is None:
+            rows = self.frame.iloc[positions]
+        else:
+            rows = self.frame.iloc[positions, self.frame.columns.get_indexer(columns)]
+        return rows if self.expand is None else self.expand(rows)
+
+    @property
+    def min_date(self):
+        return pd.Timestamp(self.dates[0]) if self.n_dated else None
+
+    @property
+    def max_date(self):
+        return pd.Timestamp(self.dates[self.n_dated - 1]) if self.n_dated else None
+
+    def values_present(self, column):
+        """
+        Categories of column that occur at least once, in category order
+        """
+        codes = np.unique(self.codes[column])
+        return [self.categories[column][code] for code in codes if code >= 0]
+
+    def date_slice(self, start, end):
+        """
+        Row range holding every date from start to end, both days included
+        """
+        dated = self.dates[:self.n_dated]
+        lo = np.searchsorted(dated, pd.Timestamp(start).to_datetime64(), side='left')
+        hi = np.searchsorted(dated, (pd.Timestamp(end) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+        return slice(int(lo), int(hi))
+
+    def _code_table(self, column, values):
+        # Index 0 of the lookup table stands for missing values (code -1)
+        allowed = np.zeros(len(self.categories[column]) + 1, dtype=bool)
+        lookup = {category: code for code, category in enumerate(self.categories[column])}
+        allowed[[lookup[value] + 1 for value in values if value in lookup]] = True
+        return allowed
+
+    def positions(self, start, end, filters=None):
+        """
+        Positions of the rows dated start..end whose coded columns take one of the given values.
+
+        filters maps a coded column to the allowed values; columns left out
+        (or mapped to None) are not filtered.
+        """
+        rows = self.date_slice(start, end)
+        keep = np.ones(rows.stop - rows.start, dtype=bool)
+        for column, values in (filters or {}).items():
+            if values is None:
+                continue
+            keep &= self._code_table(column, values)[self.codes[column][rows] + 1]
+        return np.flatnonzero(keep) + rows.start
+
+    def filter(self, start, end, filters=None):
+        """
+        The rows selected by positions() as a DataFrame
+        """
+        rows = self.date_slice(start, end)
+        if not filters or all(values is None for values in filters.values()):
+            return self.frame.iloc[rows]
+        return self.frame.iloc[self.positions(start, end, filters)]
+
+    def search(self, positions, text, id_column='Transaction ID'):
+        """
+        Keep the positions whose ID or coded columns contain text (case-insensitive)
+        """
+        text = text.lower()
+        found = np.zeros(len(positions), dtype=bool)
+        for column, categories in self.categories.items():
+            matching = [category for category in categories if text in str(category).lower()]
+            if matching:
+                found |= self._code_table(column, matching)[self.codes[column][positions] + 1]
+        ids = decode_transaction_ids(self.frame[id_column].to_numpy()[positions])
+        found |= ids.str.contains(text, case=False, regex=False).to_numpy(dtype=bool, na_value=False)
+        return positions[found]
+
+    def page(self, positions, page, page_size, sort_column=None, descending=False):
+        """
+        One page of the rows at positions, optionally sorted on sort_column first
+        """
+        if sort_column is not None and sort_column != self.date_column:
+            # Sort on the values as shown; a column only expand adds is derived from the date
+            stored = sort_column if sort_column in self.frame else self.date_column
+            values = self._rows(positions, [stored])[sort_column].reset_index(drop=True)
+            order = values.sort_values(ascending=not descending, kind='stable', na_position='last').index
+            positions = positions[order.to_numpy()]
+        elif descending:
+            # Already sorted by date
+            positions = positions[::-1]
+        start = page * page_size
+        return self._rows(positions[start:start + page_size])
+
+    def csv_file(self, positions, chunksize=EXPORT_CHUNKSIZE):
+        """
+        Write the rows at positions to a temporary CSV file a chunk at a time and return it opened for reading.
+
+        Only one chunk is expanded at a time, but Streamlit's download_button
+        reads the returned file into memory whole to serve it.
+        """
+        out = tempfile.TemporaryFile(mode='w+b')
+        for start in range(0, max(len(positions), 1), chunksize):
+            chunk = self._rows(positions[start:start + chunksize])
+            out.write(chunk.to_csv(index=False, header=start == 0).encode('utf-8'))
+        out.seek(0)
+        return out
@@ -0,0 +1,134 @@
+import pandas as pd
+
+# Allowed values for the categorical columns of a cleaned sales frame
+VALID_ITEMS = ['Coffee', 'Tea', 'Cake', 'Cookie', 'Sandwich', 'Salad', 'Smoothie', 'Juice']
+VALID_PAYMENTS = ['Credit Card', 'Cash', 'Digital Wallet']
+VALID_LOCATIONS = ['In-store', 'Takeaway']
+
+CATEGORICAL_COLUMNS = {
+    'Item': VALID_ITEMS,
+    'Payment Method': VALID_PAYMENTS,
+    'Location': VALID_LOCATIONS,
+}
+MONEY_COLUMNS = ['Price Per Unit', 'Total Spent']
+DATE_COLUMNS = ['Transaction Date']
+
+# Transaction IDs of the usual form; no leading zero, so the number gives the ID back
+TXN_PREFIX = 'TXN_'
+TXN_ID_PATTERN = r'TXN_[1-9][0-9]{0,17}'
+
+# Calendar fields of the analyzed data, derived from Transaction Date whenever they are needed
+CALENDAR_FIELDS = {
+    'Month': lambda dates: dates.dt.to_period('M').dt.to_timestamp(),
+    'DayOfWeek': lambda dates: dates.dt.day_name(),
+}
+
+
+def apply_column_types(df, money_dtype='float32'):
+    """
+    Give a sales frame compact, explicit dtypes: fixed categoricals for the
+    low-cardinality strings, datetime64 dates and float32 money columns
+    (money_dtype='float64' keeps full precision for aggregates)
+    """
+    df = df.copy()
+    for column, categories in CATEGORICAL_COLUMNS.items():
+        if column in df:
+            df[column] = pd.Categorical(df[column], categories=categories)
+    for column in DATE_COLUMNS:
+        if column in df:
+            # ISO8601 accepts date-only and timestamped values mixed in one column
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    for column in MONEY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype(money_dtype)
+    return df
+
+
+def transaction_id_numbers(ids):
+    """
+    Mask of the IDs of the TXN_<number> form and their numbers as int64
+    """
+    ids = pd.Series(ids, dtype=object).reset_index(drop=True)
+    numeric = ids.str.fullmatch(TXN_ID_PATTERN).to_numpy(dtype=bool, na_value=False)
+    numbers = ids[numeric].str.slice(len(TXN_PREFIX)).astype('int64').to_numpy()
+    return numeric, numbers
+
+
+def encode_transaction_ids(ids):
+    """
+    The IDs as int64 numbers, or None unless every one of them has the TXN_<number> form
+    """
+    numeric, numbers = transaction_id_numbers(ids)
+    return numbers if numeric.all() else None
+
+
+def decode_transaction_ids(ids):
+    """
+    Turn Transaction IDs encoded by encode_transaction_ids back into strings (others are returned as they are)
+    """
+    ids = pd.Series(ids)
+    if not pd.api.types.is_integer_dtype(ids.dtype):
+        return ids
+    return TXN_PREFIX + ids.astype(str)
+
+
+def compact_quantity(quantity):
+    """
+    Quantity as nullable Int8 when every value is a small whole number, float32 otherwise
+    """
+    values = quantity.astype('float64')
+    present = values.dropna()
+    if ((present % 1 == 0) & present.between(-128, 127)).all():
+        return values.astype('Int8')
+    return values.astype('float32')
+
+
+def compact_column_types(df):
+    """
+    apply_column_types plus the rest of the compact in-memory layout: Int8
+    quantities, int64 Transaction IDs (when they all follow TXN_<number>)
+    and no stored calendar fields, which calendar_field derives on demand.
+
+    Around 25 bytes a row instead of several hundred for the object
+    columns read from CSV; expand_compact_columns gives the analyzed layout back.
+    """
+    df = apply_column_types(df.drop(columns=[c for c in CALENDAR_FIELDS if c in df]))
+    if 'Quantity' in df:
+        df['Quantity'] = compact_quantity(df['Quantity'])
+    if 'Transaction ID' in df and not pd.api.types.is_integer_dtype(df['Transaction ID'].dtype):
+        numbers = encode_transaction_ids(df['Transaction ID'])
+        if numbers is not None:
+            df['Transaction ID'] = numbers
+    return df
+
+
+def calendar_field(df, name, date_column='Transaction Date'):
+    """
+    Calendar field name ('Month' or 'DayOfWeek') of every row, from its date
+    """
+    return CALENDAR_FIELDS[name](df[date_column]).rename(name)
+
+
+def expand_compact_columns(df, date_column='Transaction Date'):
+    """
+    Rows of a compact frame with the columns of the analyzed data: string
+    Transaction IDs, float quantities and the calendar fields. Works on any
+    subset of the columns, so callers can expand only what they show.
+    """
+    df = df.copy()
+    if 'Transaction ID' in df:
+        df['Transaction ID'] = decode_transaction_ids(df['Transaction ID']).to_numpy()
+    if 'Quantity' in df:
+        df['Quantity'] = df['Quantity'].astype('float64')
+    if date_column in df:
+        for name in CALENDAR_FIELDS:
+            if name not in df:
+                df[name] = calendar_field(df, name, date_column)
+    return df
+
+
+def memory_mb(df):
+    """
+    Memory held by a frame, object strings included, in MB
+    """
+    return float(df.memory_usage(deep=True).sum()) / 2 ** 20
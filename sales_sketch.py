@@ -0,0 +1,203 @@
+"""
+Load-time summaries for the dashboard's sale percentiles and fast mode.
+
+The dashboard's totals and charts come from the daily cube, whose size
+does not depend on how many transactions there are. Two questions still
+need the transactions themselves: the number of distinct Transaction IDs
+when IDs repeat, and percentiles of the sale value. SalesSketch answers
+them from summaries built once at load time, in time bounded by their
+own size:
+
+    percentiles    exactly, from the count of every Total Spent value per
+                   day x Item x Location, summed for the selected cells
+    distinct IDs   (fast mode) a HyperLogLog sketch per day x Item x
+                   Location, merged for the selected cells (about 3%
+                   standard error)
+    percentiles    (fast mode) a stratified sample (month x Item x
+                   Location strata) with weights, and a Woodruff
+                   confidence interval
+
+All are filtered like the cube (date range, Item, Location).
+"""
+import numpy as np
+import pandas as pd
+
+from sales_index import IndexedSales
+
+# 2**10 registers per sketch: 1.04 / sqrt(1024), about 3.3% standard error
+HLL_PRECISION = 10
+SKETCH_KEYS = ['Transaction Date', 'Item', 'Location']
+# The columns the dashboard filters on besides the date
+FILTER_COLUMNS = ['Item', 'Location']
+SAMPLE_PER_STRATUM = 200
+# Normal quantile of a two-sided 95% interval
+Z_95 = 1.959964
+
+
+def _leading_zeros(values):
+    # Leading zero bits of non-zero uint64 values, by halving the window six times
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high_clear = values < np.uint64(1 << (64 - shift))
+        zeros[high_clear] += shift
+        values[high_clear] <<= np.uint64(shift)
+    return zeros
+
+
+def hll_registers(ids, groups, n_groups, precision=HLL_PRECISION):
+    """
+    HyperLogLog registers (n_groups x 2**precision, uint8) of the ids of each group
+    """
+    hashes = pd.util.hash_array(np.asarray(ids))
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # The set low bit bounds the rank when the remaining bits are all zero
+    rest = (hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))
+    rank = _leading_zeros(rest) + 1
+
+    registers = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    np.maximum.at(registers, (groups, index), rank)
+    return registers
+
+
+def hll_estimate(registers):
+    """
+    Distinct count estimated from one row of registers
+    """
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    empty = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and empty:
+        # Linear counting is more accurate for small counts
+        return m * np.log(m / empty)
+    return estimate
+
+
+def stratified_sample(df, per_stratum=SAMPLE_PER_STRATUM, seed=0):
+    """
+    Up to per_stratum rows with a Total Spent of every month x Item x Location.
+
+    Each sampled row carries its stratum, the stratum's size and sample size.
+    """
+    df = df[df['Total Spent'].notna()]
+    strata = df.groupby([df['Transaction Date'].dt.to_period('M'), df['Item'], df['Location']],
+                        observed=True, dropna=False).ngroup().to_numpy()
+    sizes = np.bincount(strata)
+
+    # A random rank within each stratum; keep the first per_stratum
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(df)), strata))
+    first = np.searchsorted(strata[order], strata[order], side='left')
+    keep = order[np.arange(len(order)) - first < per_stratum]
+    keep.sort()
+
+    sample = df.iloc[keep][SKETCH_KEYS + ['Total Spent']].copy()
+    sample['Stratum'] = strata[keep]
+    sample['Stratum Size'] = sizes[strata[keep]]
+    sample['Stratum Sample'] = np.minimum(sizes[strata[keep]], per_stratum)
+    return sample.reset_index(drop=True)
+
+
+def value_counts_table(df, column='Total Spent'):
+    """
+    The distinct values of column and how often each occurs per day x Item x Location.
+
+    Returns (sorted distinct values, a frame of SKETCH_KEYS, 'Value' (a
+    position in the values) and 'Count'); sale values repeat a lot (a few
+    prices times a few quantities), so the table is far smaller than df.
+    """
+    df = df[df[column].notna()]
+    values, codes = np.unique(df[column].to_numpy(dtype='float64'), return_inverse=True)
+    table = df[SKETCH_KEYS[1:]].assign(**{'Transaction Date': df['Transaction Date'].dt.normalize(),
+                                          'Value': codes.astype(np.int32)})
+    table = table.groupby(SKETCH_KEYS + ['Value'], observed=True, dropna=False).size().rename('Count')
+    return values, table.astype(np.int64).reset_index()
+
+
+def _weighted_cdf_inverse(values, weights, p):
+    # Smallest value whose weighted share of values at or below it reaches p
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    position = np.searchsorted(cumulative, p * cumulative[-1], side='left')
+    return values[order][min(position, len(values) - 1)]
+
+
+class SalesSketch:
+    """
+    Load-time summaries of a transaction frame for approximate dashboard queries
+    """
+
+    def __init__(self, df, distinct=True, precision=HLL_PRECISION, per_stratum=SAMPLE_PER_STRATUM, seed=0):
+        self.precision = precision
+        self.cells = self.registers = None
+        if distinct:
+            # Sorted by date first, so IndexedSales keeps the cells in register order
+            groups = df.groupby([df['Transaction Date'].dt.normalize(), df['Item'], df['Location']],
+                                observed=True, dropna=False, sort=True)
+            cells = groups.size().reset_index()[SKETCH_KEYS]
+            self.registers = hll_registers(df['Transaction ID'], groups.ngroup().to_numpy(), len(cells), precision)
+            self.cells = IndexedSales(cells, coded_columns=FILTER_COLUMNS)
+        self.sample = IndexedSales(stratified_sample(df, per_stratum, seed), coded_columns=FILTER_COLUMNS)
+        self.values, counts = value_counts_table(df)
+        self.value_counts = IndexedSales(counts, coded_columns=FILTER_COLUMNS)
+
+    def exact_sale_quantiles(self, start, end, filters=None, quantiles=(0.5, 0.9)):
+        """
+        Each quantile of Total Spent over the selected rows, or None without rows.
+
+        The same as np.quantile(..., method='inverted_cdf') on the rows
+        themselves: the value counts of the selected cells are summed and
+        the smallest value whose cumulative count reaches the quantile wins.
+        """
+        positions = self.value_counts.positions(start, end, filters)
+        table = self.value_counts.frame
+        counts = np.bincount(table['Value'].to_numpy()[positions], weights=table['Count'].to_numpy()[positions],
+                             minlength=len(self.values))
+        cumulative = np.cumsum(counts)
+        if not len(cumulative) or cumulative[-1] == 0:
+            return None
+        return [float(self.values[np.searchsorted(cumulative, q * cumulative[-1], side='left')])
+                for q in quantiles]
+
+    def distinct_transactions(self, start, end, filters=None):
+        """
+        (estimated distinct Transaction IDs, relative standard error) of the selected rows
+        """
+        positions = self.cells.positions(start, end, filters)
+        merged = self.registers[positions].max(axis=0) if len(positions) else np.zeros(1 << self.precision, np.uint8)
+        return hll_estimate(merged), 1.04 / np.sqrt(1 << self.precision)
+
+    def sale_quantiles(self, start, end, filters=None, quantiles=(0.5, 0.9), z=Z_95):
+        """
+        (estimate, low, high) of each quantile of Total Spent over the selected rows, or None without rows.
+
+        The interval is Woodruff's: the stratified standard error of the
+        estimated share of sales at or below the quantile, mapped back
+        through the weighted distribution. It is empty when every stratum
+        was sampled whole.
+        """
+        rows = self.sample.frame.iloc[self.sample.positions(start, end, filters)]
+        if not len(rows):
+            return None
+        values = rows['Total Spent'].to_numpy(dtype='float64')
+        weights = (rows['Stratum Size'] / rows['Stratum Sample']).to_numpy()
+        strata = rows['Stratum'].to_numpy()
+        # Without replacement: the finite population correction of each stratum
+        fpc = (1 - rows['Stratum Sample'] / rows['Stratum Size']).to_numpy()
+        total = weights.sum()
+
+        results = []
+        for q in quantiles:
+            estimate = _weighted_cdf_inverse(values, weights, q)
+            below = pd.DataFrame({'stratum': strata, 'below': values <= estimate, 'weight': weights, 'fpc': fpc})
+            by_stratum = below.groupby('stratum').agg(n=('below', 'size'), share=('below', 'mean'),
+                                                      weight=('weight', 'sum'), fpc=('fpc', 'first'))
+            n = by_stratum['n'].clip(lower=2)
+            variance = ((by_stratum['weight'] / total) ** 2 * by_stratum['fpc']
+                        * by_stratum['share'] * (1 - by_stratum['share']) / (n - 1)).sum()
+            margin = z * np.sqrt(variance)
+            results.append((estimate,
+                            _weighted_cdf_inverse(values, weights, max(q - margin, 0.0)),
+                            _weighted_cdf_inverse(values, weights, min(q + margin, 1.0))))
+        return results
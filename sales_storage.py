@@ -0,0 +1,149 @@
+import os
+import pandas as pd
+
+from sales_schema import CALENDAR_FIELDS, apply_column_types, compact_column_types
+
+# Columnar formats need pyarrow; without it everything falls back to CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather'}
+COLUMNAR_FORMATS = ['parquet', 'feather']
+
+
+def columnar_available():
+    return pa is not None
+
+
+def path_for_format(path, fmt):
+    """
+    Swap the extension of path for the one used by fmt ('csv', 'parquet' or 'feather')
+    """
+    return os.path.splitext(path)[0] + '.' + fmt
+
+
+def find_dataset(path):
+    """
+    Return the freshest existing copy of a dataset, whatever its format.
+
+    'cleaned_cafe_sales.csv' may also exist as .parquet or .feather; the
+    most recently written one wins, columnar formats first on a tie. Returns
+    None when no copy exists.
+    """
+    candidates = []
+    for preference, fmt in enumerate(COLUMNAR_FORMATS + ['csv']):
+        candidate = path_for_format(path, fmt)
+        if os.path.exists(candidate) and (fmt == 'csv' or columnar_available()):
+            candidates.append((-os.path.getmtime(candidate), preference, candidate))
+    return min(candidates)[2] if candidates else None
+
+
+def load_sales(path, columns=None, compact=False):
+    """
+    Load a sales dataset written by save_sales (or any of the pipeline CSVs) with typed columns.
+
+    compact=True gives the smaller layout of compact_column_types instead
+    (Int8 quantities, int64 Transaction IDs, no stored calendar fields).
+    """
+    fmt = FORMATS.get(os.path.splitext(path)[1], 'csv')
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    elif fmt == 'feather':
+        df = pd.read_feather(path, columns=columns)
+    else:
+        if compact and columns is None:
+            # Derived again on demand, so never parse them
+            columns = lambda column: column not in CALENDAR_FIELDS
+        df = pd.read_csv(path, usecols=columns)
+    return compact_column_types(df) if compact else apply_column_types(df)
+
+
+def iter_sales(path, chunksize=500_000, money_dtype='float32'):
+    """
+    Yield a sales dataset (as load_sales reads it) in typed chunks of about chunksize rows
+    (money_dtype='float64' keeps the money columns at full precision)
+    """
+    fmt = FORMATS.get(os.path.splitext(path)[1], 'csv')
+    if fmt == 'parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield apply_column_types(batch.to_pandas(), money_dtype)
+    elif fmt == 'feather':
+        # Memory-mapped, one record batch (as written by SalesWriter) at a time
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield apply_column_types(reader.get_batch(i).to_pandas(), money_dtype)
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            yield apply_column_types(chunk, money_dtype)
+
+
+def save_sales(df, path):
+    """
+    Write a sales frame in the format given by the extension of path.
+
+    Columnar formats are stored with typed columns. When pyarrow is not
+    installed the frame is written as CSV next to the requested path
+    instead. Returns the path actually written.
+    """
+    fmt = FORMATS.get(os.path.splitext(path)[1], 'csv')
+    if fmt != 'csv' and not columnar_available():
+        print(f"⚠️  pyarrow is not installed, writing CSV instead of {fmt}")
+        fmt, path = 'csv', path_for_format(path, 'csv')
+
+    if fmt == 'parquet':
+        apply_column_types(df).to_parquet(path, index=False)
+    elif fmt == 'feather':
+        apply_column_types(df).reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+class SalesWriter:
+    """
+    Append sales frames chunk by chunk to a single CSV, Parquet or Feather file
+    (columnar formats store money as money_dtype, float32 unless asked otherwise)
+    """
+
+    def __init__(self, path, append=False, money_dtype='float32'):
+        fmt = FORMATS.get(os.path.splitext(path)[1], 'csv')
+        if fmt != 'csv' and not columnar_available():
+            print(f"⚠️  pyarrow is not installed, writing CSV instead of {fmt}")
+            fmt, path = 'csv', path_for_format(path, 'csv')
+        # Appending to a file that does not exist yet starts it
+        append = append and os.path.exists(path)
+        if append and fmt != 'csv':
+            raise ValueError(f"Appending to an existing {fmt} file is not supported, use CSV")
+
+        self.path = path
+        self.format = fmt
+        self.money_dtype = money_dtype
+        self._write_header = not append
+        self._schema = None
+        self._writer = None
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='w' if self._write_header else 'a', header=self._write_header, index=False)
+            self._write_header = False
+            return
+
+        table = pa.Table.from_pandas(apply_column_types(df, self.money_dtype), schema=self._schema,
+                                     preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.format == 'parquet':
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                options = pa.ipc.IpcWriteOptions(compression='lz4')
+                self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
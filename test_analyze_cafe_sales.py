@@ -0,0 +1,26 @@
+"""
+Tests of the aggregates the analysis reports and charts are drawn from.
+
+    python -m pytest test_analyze_cafe_sales.py
+"""
+import numpy as np
+import pandas as pd
+from matplotlib.cbook import boxplot_stats
+
+from analyze_cafe_sales import compute_price_counts, compute_price_quantiles
+
+
+def test_price_quantiles_match_matplotlib():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        # A few distinct prices with skewed counts, as a menu item has
+        prices = rng.choice([1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 20.0], size=rng.integers(2, 5), replace=False)
+        sales = pd.DataFrame({
+            'Item': 'Coffee',
+            'Price Per Unit': rng.choice(prices, size=rng.integers(1, 40), p=rng.dirichlet(np.ones(len(prices)))),
+        })
+        ours = compute_price_quantiles(compute_price_counts(sales)).loc['Coffee']
+        expected = boxplot_stats(sales['Price Per Unit'].to_numpy())[0]
+        for stat in ['q1', 'med', 'q3', 'whislo', 'whishi']:
+            assert np.isclose(ours[stat], expected[stat]), (stat, sales['Price Per Unit'].tolist())
+        assert sorted(ours['fliers']) == sorted(set(expected['fliers'].tolist()))
@@ -0,0 +1,35 @@
+"""
+Smoke tests of the dashboard, run headless with Streamlit's AppTest.
+
+    python -m pytest test_dashboard.py
+"""
+import os
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from clean_cafe_sales import clean_sales_data
+from transaction_store import TransactionStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD = os.path.join(HERE, 'dashboard.py')
+RAW_SAMPLE = os.path.join(HERE, 'dirty_cafe_sales.csv')
+
+
+def test_store_mode_renders(tmp_path, monkeypatch):
+    db = tmp_path / 'cafe_sales.db'
+    store = TransactionStore(str(db))
+    store.insert(clean_sales_data(pd.read_csv(RAW_SAMPLE)))
+    analyzed = len(store.select())
+    store.close()
+
+    # Run where no analyzed file exists, so only the store can be used
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('CAFE_SALES_DB', str(db))
+    app = AppTest.from_file(DASHBOARD, default_timeout=120)
+    app.run()
+
+    assert not app.exception
+    assert not app.error
+    metrics = {metric.label: metric.value for metric in app.metric}
+    assert metrics['Total Transactions'] == f'{analyzed:,}'
@@ -0,0 +1,42 @@
+"""
+Tests of the revenue baselines, anomaly flags and forecasts.
+
+    python -m pytest test_forecasting.py
+"""
+import numpy as np
+
+from forecasting import ANOMALY_Z, HORIZON, SEASON, SEASON_WEEKS, STD_FLOOR, fit_revenue
+
+FLAT_DAYS = 8 * SEASON * 2
+SPIKE = FLAT_DAYS
+
+
+def spike_after_flat(days=FLAT_DAYS + (SEASON_WEEKS + 2) * SEASON, level=100.0, spike=1000.0):
+    revenue = np.full((1, days), level)
+    revenue[0, SPIKE] = spike
+    return revenue
+
+
+def test_spike_after_flat_history_is_flagged():
+    fit = fit_revenue(spike_after_flat())
+    assert fit['anomaly'][0, SPIKE]
+    assert fit['z'][0, SPIKE] > 3
+    assert fit['anomaly'][0].sum() == 1
+
+
+def test_flagged_day_capped_in_later_baselines():
+    fit = fit_revenue(spike_after_flat())
+    # The spike enters its weekday mean at the edge of the band: 100 + ANOMALY_Z x 10% of 100
+    cap = 100.0 + ANOMALY_Z * STD_FLOOR * 100.0
+    later = fit['baseline'][0, SPIKE + 1:]
+    assert later.max() <= (100.0 * (SEASON_WEEKS - 1) + cap) / SEASON_WEEKS + 1e-9
+    assert np.allclose(later[-SEASON:], 100.0)
+    assert np.allclose(fit['forecast'][0], 100.0)
+    assert fit['forecast'].shape == (1, HORIZON)
+
+
+def test_spike_at_end_capped_in_forecast():
+    fit = fit_revenue(spike_after_flat(days=SPIKE + 1))
+    assert fit['anomaly'][0, -1]
+    assert fit['forecast'][0].max() < 110.0
+    assert fit['high'][0].max() < 200.0
@@ -0,0 +1,280 @@
+"""
+Embedded SQLite store for the cleaned transactions.
+
+The cleaner bulk-inserts into it (--db) and the analysis and the dashboard
+can read from it instead of loading the whole history into pandas: every
+aggregate is pushed down as a GROUP BY to the sales cube grain (day x hour
+x Item x Payment Method x Location), so only a few thousand rows ever reach
+Python, and the raw-data view pages through it with LIMIT/OFFSET.
+
+    python clean_cafe_sales.py --chunksize 500000 --db cafe_sales.db
+    python analyze_cafe_sales.py --db cafe_sales.db
+    CAFE_SALES_DB=cafe_sales.db streamlit run dashboard.py
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import pandas as pd
+
+from sales_schema import apply_column_types
+
+DEFAULT_DB = 'cafe_sales.db'
+EXPORT_CHUNKSIZE = 200_000
+
+STORE_COLUMNS = ['Transaction ID', 'Item', 'Quantity', 'Price Per Unit', 'Total Spent',
+                 'Payment Method', 'Location', 'Transaction Date']
+TEXT_COLUMNS = ['Item', 'Payment Method', 'Location']
+SEARCH_COLUMNS = ['Transaction ID'] + TEXT_COLUMNS
+# Columns of analyzed_transactions shown to users, as in analyzed_cafe_sales
+ANALYZED_COLUMNS = STORE_COLUMNS + ['Month', 'DayOfWeek']
+# Dates are stored as ISO text with their time of day, which sorts and
+# compares in time order; date bounds of a selection are given as days
+STORE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+STORE_DAY_FORMAT = '%Y-%m-%d'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    "Transaction ID" TEXT NOT NULL PRIMARY KEY,
+    "Item" TEXT,
+    "Quantity" REAL,
+    "Price Per Unit" REAL,
+    "Total Spent" REAL,
+    "Payment Method" TEXT,
+    "Location" TEXT,
+    "Transaction Date" TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions ("Transaction Date");
+CREATE INDEX IF NOT EXISTS transactions_item ON transactions ("Item");
+CREATE INDEX IF NOT EXISTS transactions_location ON transactions ("Location");
+
+-- The rows the analysis works on (it drops every row with a missing value),
+-- with the same extra columns as analyzed_cafe_sales and the insertion order
+-- (views have no rowid of their own)
+CREATE VIEW IF NOT EXISTS analyzed_transactions AS
+SELECT *,
+       rowid AS "Row Order",
+       strftime('%Y-%m', "Transaction Date") AS "Month",
+       CASE CAST(strftime('%w', "Transaction Date") AS INTEGER)
+           WHEN 0 THEN 'Sunday' WHEN 1 THEN 'Monday' WHEN 2 THEN 'Tuesday'
+           WHEN 3 THEN 'Wednesday' WHEN 4 THEN 'Thursday' WHEN 5 THEN 'Friday'
+           ELSE 'Saturday' END AS "DayOfWeek"
+FROM transactions
+WHERE "Item" IS NOT NULL AND "Quantity" IS NOT NULL AND "Price Per Unit" IS NOT NULL
+  AND "Total Spent" IS NOT NULL AND "Payment Method" IS NOT NULL
+  AND "Location" IS NOT NULL AND "Transaction Date" IS NOT NULL;
+"""
+
+CUBE_QUERY = """
+SELECT date("Transaction Date") AS "Transaction Date",
+       CAST(strftime('%H', "Transaction Date") AS INTEGER) AS "Hour",
+       "Item", "Payment Method", "Location",
+       SUM("Total Spent") AS "Total Spent",
+       SUM("Quantity") AS "Quantity",
+       COUNT("Total Spent") AS "Sales Count",
+       COUNT(*) AS "Row Count",
+       COUNT(DISTINCT "Transaction ID") AS "Transaction Count"
+FROM analyzed_transactions
+WHERE {where}
+GROUP BY 1, 2, "Item", "Payment Method", "Location"
+"""
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class Selection:
+    """
+    A WHERE clause over analyzed_transactions with its parameters
+    """
+
+    def __init__(self, store, where='1', params=()):
+        self.store = store
+        self.where = where
+        self.params = tuple(params)
+        self._count = None
+
+    def narrow(self, where, params=()):
+        return Selection(self.store, f'({self.where}) AND ({where})', self.params + tuple(params))
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.store.scalar(
+                f'SELECT COUNT(*) FROM analyzed_transactions WHERE {self.where}', self.params)
+        return self._count
+
+
+class TransactionStore:
+    """
+    The cleaned transactions in a SQLite file, keyed by Transaction ID.
+
+    One connection is shared by every thread (the dashboard caches a single
+    store for all sessions), so statements are serialized with a lock.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.scalar('SELECT COUNT(*) FROM transactions')
+
+    def close(self):
+        self._conn.close()
+
+    def insert(self, df):
+        """
+        Bulk-insert cleaned rows, skipping Transaction IDs already stored; returns the number inserted
+        """
+        rows = df[STORE_COLUMNS].assign(**{
+            'Transaction Date': pd.to_datetime(df['Transaction Date'], format='ISO8601').dt.strftime(STORE_DATE_FORMAT),
+        })
+        rows = rows.astype(object).where(rows.notna(), None)
+        placeholders = ', '.join('?' * len(STORE_COLUMNS))
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(f'INSERT OR IGNORE INTO transactions VALUES ({placeholders})',
+                                   rows.itertuples(index=False, name=None))
+            return self._conn.total_changes - before
+
+    def scalar(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def query(self, sql, params=()):
+        """
+        Run a query and return its result with the usual sales column types
+        (money stays float64: SQLite sums it in double precision)
+        """
+        with self._lock:
+            result = pd.read_sql_query(sql, self._conn, params=params)
+        return apply_column_types(result, money_dtype='float64')
+
+    def query_chunks(self, sql, params=(), chunksize=EXPORT_CHUNKSIZE):
+        """
+        Stream a large result chunk by chunk, on a connection of its own so other queries are not blocked
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+                yield apply_column_types(chunk, money_dtype='float64')
+        finally:
+            conn.close()
+
+    def select(self, start=None, end=None, filters=None):
+        """
+        Selection of the analyzed rows dated start..end (both days included)
+        whose columns take one of the given values; filters maps a column to
+        the allowed values, None meaning no filter
+        """
+        clauses, params = ['1'], []
+        if start is not None:
+            clauses.append('"Transaction Date" >= ?')
+            params.append(pd.Timestamp(start).strftime(STORE_DAY_FORMAT))
+        if end is not None:
+            clauses.append('"Transaction Date" < ?')
+            params.append((pd.Timestamp(end) + pd.Timedelta(days=1)).strftime(STORE_DAY_FORMAT))
+        for column, values in (filters or {}).items():
+            if values is None:
+                continue
+            values = list(values)
+            clauses.append(f'{_quote(column)} IN ({", ".join("?" * len(values))})' if values else '0')
+            params.extend(values)
+        return Selection(self, ' AND '.join(clauses), params)
+
+    def cube(self, selection=None):
+        """
+        The sales cube of the selected rows (all analyzed rows by default), aggregated in SQL
+        """
+        if selection is None:
+            selection = self.select()
+        return self.query(CUBE_QUERY.format(where=selection.where), selection.params)
+
+    def price_counts(self):
+        """
+        Number of analyzed rows at each Item and Price Per Unit
+        """
+        return self.query('SELECT "Item", "Price Per Unit", COUNT(*) AS "Count" FROM analyzed_transactions '
+                          'GROUP BY "Item", "Price Per Unit"')
+
+
+class StoreSales:
+    """
+    The raw-data side of the dashboard served from a TransactionStore.
+
+    Mirrors the IndexedSales methods the dashboard uses, with a Selection
+    (a WHERE clause) standing in for an array of row positions, so no row
+    is read until a page or the CSV export asks for it.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.columns = list(ANALYZED_COLUMNS)
+        self.date_column = 'Transaction Date'
+        self._select = 'SELECT ' + ', '.join(_quote(column) for column in self.columns) + ' FROM analyzed_transactions'
+        # Every analyzed row; it counts them once (the dashboard makes a new
+        # StoreSales whenever the store file changes)
+        self._all = store.select()
+
+    def __len__(self):
+        return len(self._all)
+
+    def positions(self, start, end, filters=None):
+        return self.store.select(start, end, filters)
+
+    def filter(self, start, end, filters=None):
+        selection = self.positions(start, end, filters)
+        return self.store.query(f'{self._select} WHERE {selection.where} '
+                                f'ORDER BY {self._order_by(None, False)}', selection.params)
+
+    def search(self, selection, text):
+        """
+        Keep the rows whose ID or text columns contain text (case-insensitive)
+        """
+        text = text.lower()
+        where = ' OR '.join(f'instr(lower({_quote(column)}), ?) > 0' for column in SEARCH_COLUMNS)
+        return selection.narrow(where, [text] * len(SEARCH_COLUMNS))
+
+    def _order_by(self, sort_column, descending):
+        # Same order as IndexedSales.page: by date (file order within a day), or
+        # by sort_column with ties left in date order
+        direction = 'DESC' if descending else 'ASC'
+        if sort_column is None or sort_column == self.date_column:
+            return f'"Transaction Date" {direction}, "Row Order" {direction}'
+        return f'{_quote(sort_column)} {direction} NULLS LAST, "Transaction Date", "Row Order"'
+
+    def page(self, selection, page, page_size, sort_column=None, descending=False):
+        return self.store.query(
+            f'{self._select} WHERE {selection.where} '
+            f'ORDER BY {self._order_by(sort_column, descending)} LIMIT ? OFFSET ?',
+            selection.params + (page_size, page * page_size))
+
+    def csv_file(self, selection, chunksize=EXPORT_CHUNKSIZE):
+        """
+        Write the selected rows to a temporary CSV file a chunk at a time and return it opened for reading.
+
+        Only one chunk is expanded at a time, but Streamlit's download_button
+        reads the returned file into memory whole to serve it.
+        """
+        out = tempfile.TemporaryFile(mode='w+b')
+        chunks = self.store.query_chunks(
+            f'{self._select} WHERE {selection.where} '
+            f'ORDER BY {self._order_by(None, False)}', selection.params, chunksize)
+        for i, chunk in enumerate(chunks):
+            out.write(chunk.to_csv(index=False, header=i == 0).encode('utf-8'))
+        out.seek(0)
+        return out
+
+
+def open_store(path=None):
+    """
+    The store at path (default: $CAFE_SALES_DB), or None when it does not exist
+    """
+    path = path or os.environ.get('CAFE_SALES_DB')
+    if not path or not os.path.exists(path):
+        return None
+    return TransactionStore(path)